@@ -0,0 +1,47 @@
+"""Build the baseline-table cohorts from the joined monthly cohorts.
+
+`analysis/baseline_tables.do` describes the study population on 01/01/2019, 01/01/2020
+and 01/01/2021. Those index dates are all months of `generate_study_population`, and the
+baseline tables need the same variables, so rather than extracting them again this
+copies the joined monthly cohort for each date to the CSV file the do-file reads,
+`input_tables_<date>.csv`, naming the household size category `big_household`.
+
+Usage:
+
+    python analysis/baseline_cohorts.py [--cohort-dir output/measures]
+                                        [--output-dir output/measures/tables]
+"""
+
+import argparse
+from pathlib import Path
+
+from cohort_io import read_cohort, read_schema, write_cohort
+
+INDEX_DATES = ["2019-01-01", "2020-01-01", "2021-01-01"]
+RENAMES = {"big": "big_household"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cohort-dir", type=Path, default=Path("output/measures"))
+    parser.add_argument("--output-dir", type=Path, default=Path("output/measures/tables"))
+    args = parser.parse_args()
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    for index_date in INDEX_DATES:
+        path = args.cohort_dir / f"input_{index_date}.feather"
+        if not path.exists():
+            raise FileNotFoundError(
+                f"{path} not found: {index_date} must be one of the index dates of "
+                "generate_study_population"
+            )
+        schema = read_schema(path)
+        schema.update({new: schema[old] for old, new in RENAMES.items() if old in schema})
+        cohort = read_cohort(path).rename(columns=RENAMES)
+        output = args.output_dir / f"input_tables_{index_date}.csv"
+        write_cohort(cohort, output, schema)
+        print(f"{output.name}: {len(cohort)} patients")
+
+
+if __name__ == "__main__":
+    main()
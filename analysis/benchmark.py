@@ -0,0 +1,209 @@
+"""Benchmark the cohort and measures actions on dummy data of increasing size.
+
+For each population size and number of index dates, this generates dummy static and
+monthly cohorts with `dummy_data.py` (standing in for cohortextractor, which needs the
+database), joins them with `join_static.py` and calculates the measures with
+`measures.py`. Each stage runs in its own process, and its wall time, peak RSS and the
+bytes it wrote are recorded in a JSON results file. The stages run with `--workers 1`:
+the peak RSS reported by `os.wait4` is that of the largest single process, so with a
+pool of workers it would miss most of the stage's memory.
+
+With `--baseline`, each stage is compared with the same stage, size and number of
+months in a results file saved earlier, and the script exits with status 1 if the wall
+time or peak RSS grew by more than `--tolerance` (default 20%) and by more than half a
+second or 10MB. Keep a baseline from before a change to the study definition or the
+measures list, e.g.
+
+    python analysis/benchmark.py --sizes 1000 100000 --months 1 12 \
+        --results output/benchmarks/baseline.json
+    # ...change analysis/study_definition.py...
+    python analysis/benchmark.py --sizes 1000 100000 --months 1 12 \
+        --baseline output/benchmarks/baseline.json
+
+Sizes default to 1k, 100k, 1M and 10M patients and months to 1, 12 and 47 index dates
+(the first months of `generate_study_population`); the larger cases take a long time
+and several GB of disk.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from cohort_fingerprints import index_dates
+
+SIZES = [1_000, 100_000, 1_000_000, 10_000_000]
+MONTHS = [1, 12, 47]
+RESULTS = Path("output/benchmarks/results.json")
+STATIC_DEFINITION = "analysis/study_definition_static.py"
+STUDY_DEFINITION = "analysis/study_definition.py"
+# changes smaller than these are noise rather than regressions
+MIN_CHANGE = {"wall_seconds": 0.5, "peak_rss_mb": 10}
+# one process per stage, so that its peak RSS is the stage's peak memory
+WORKERS = ["--workers", "1"]
+
+
+def run_stage(command):
+    """Run `command`, returning its wall time in seconds and peak RSS in MB."""
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    # ru_maxrss is in kilobytes on Linux
+    return elapsed, usage.ru_maxrss / 1024
+
+
+def directory_bytes(directory, pattern="*"):
+    return sum(path.stat().st_size for path in Path(directory).glob(pattern) if path.is_file())
+
+
+def benchmark_case(size, dates, work_dir, seed):
+    python = sys.executable
+    static_dir = work_dir / "static"
+    cohort_dir = work_dir / "cohorts"
+    joined_dir = work_dir / "joined"
+    stages = [
+        (
+            "generate_static_attributes",
+            [python, "analysis/dummy_data.py", "--size", str(size), "--seed", str(seed),
+             "--study-definition", STATIC_DEFINITION, "--output-dir", str(static_dir),
+             "--name", "input_static", *WORKERS],
+            static_dir,
+            "*",
+        ),
+        (
+            "generate_study_population",
+            [python, "analysis/dummy_data.py", "--size", str(size), "--seed", str(seed),
+             "--study-definition", STUDY_DEFINITION, "--output-dir", str(cohort_dir),
+             "--index-date-range", f"{dates[0]} to {dates[-1]} by month", *WORKERS],
+            cohort_dir,
+            "*",
+        ),
+        (
+            "join_static_attributes",
+            [python, "analysis/join_static.py", str(cohort_dir), str(joined_dir),
+             "--static-cohort", str(static_dir / "input_static.feather"), *WORKERS],
+            joined_dir,
+            "input_*",
+        ),
+        (
+            "calculate_measures",
+            [python, "analysis/measures.py", "--study-definition", STUDY_DEFINITION,
+             "--output-dir", str(joined_dir), *WORKERS],
+            joined_dir,
+            "measure_*",
+        ),
+    ]
+    results = []
+    for stage, command, output_dir, pattern in stages:
+        wall_seconds, peak_rss_mb = run_stage(command)
+        results.append(
+            {
+                "stage": stage,
+                "size": size,
+                "months": len(dates),
+                "wall_seconds": round(wall_seconds, 3),
+                "peak_rss_mb": round(peak_rss_mb, 1),
+                "output_bytes": directory_bytes(output_dir, pattern),
+            }
+        )
+        print(
+            f"{stage:<28} {size:>10,} patients {len(dates):>3} months "
+            f"{wall_seconds:8.2f}s {peak_rss_mb:9.1f}MB"
+        )
+    return results
+
+
+def _key(result):
+    return (result["stage"], result["size"], result["months"])
+
+
+def regressions(results, baseline, tolerance):
+    """Return a message for each result that is slower or bigger than its baseline."""
+    previous = {_key(result): result for result in baseline["results"]}
+    messages = []
+    for result in results:
+        before = previous.get(_key(result))
+        if before is None:
+            continue
+        for metric in ("wall_seconds", "peak_rss_mb"):
+            if (
+                result[metric] > before[metric] * (1 + tolerance)
+                and result[metric] - before[metric] > MIN_CHANGE[metric]
+            ):
+                messages.append(
+                    f"{result['stage']} ({result['size']:,} patients, {result['months']} "
+                    f"months): {metric} {before[metric]} -> {result[metric]}"
+                )
+    return messages
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--months", type=int, nargs="+", default=MONTHS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results", type=Path, default=RESULTS)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--work-dir", type=Path, help="kept for inspection if given")
+    args = parser.parse_args()
+
+    dates = index_dates()
+    results = []
+    for size in args.sizes:
+        for months in args.months:
+            if args.work_dir:
+                work_dir = args.work_dir / f"{size}_{months}"
+                shutil.rmtree(work_dir, ignore_errors=True)
+                results.extend(benchmark_case(size, dates[:months], work_dir, args.seed))
+            else:
+                with tempfile.TemporaryDirectory() as work_dir:
+                    results.extend(
+                        benchmark_case(size, dates[:months], Path(work_dir), args.seed)
+                    )
+
+    args.results.parent.mkdir(parents=True, exist_ok=True)
+    args.results.write_text(
+        json.dumps(
+            {
+                "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "cpus": os.cpu_count(),
+                "results": results,
+            },
+            indent=2,
+        )
+        + "\n"
+    )
+
+    if args.baseline:
+        messages = regressions(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for message in messages:
+            print(f"REGRESSION {message}")
+        if messages:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Draw the time-series line charts for every measure.
+
+`analysis/lines.do` draws one chart per outcome (`lines_<outcome>.svg`, by living
+alone) and one per outcome and stratum (`lines_<outcome>_<stratum>.svg`, a panel per
+combination of living alone and the stratum), and `analysis/self_harm_graph.do` draws
+self-harm mortality per million from counts rounded to the midpoint of bands of 7
+(`line_selfharmmort.svg`). This draws the same charts from the measures in a pool
+of worker processes, with the first lockdown marked by a solid line and 01/01/2021,
+01/05/2021 and 01/01/2022 by dashed green lines, as in the do-files.
+
+Usage:
+
+    python analysis/charts.py [--registry output/measures/registry]
+                              [--store output/measures/measures.parquet]
+                              [--measures-dir output/measures]
+                              [--study-definition analysis/study_definition.py]
+                              [--output-dir output/charts] [--workers N]
+"""
+
+import argparse
+import math
+from dataclasses import dataclass
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.dates
+import matplotlib.pyplot as plt
+import matplotlib.ticker
+import pandas as pd
+
+from cohort_io import atomic_path
+from disclosure import rounding_scheme
+from its import group_labels, iter_measures
+from parallel import add_arguments, map_tasks, worker_count
+
+OUTCOMES = ["anxiety", "depression", "eating_disorder", "ocd", "self_harm", "severe_mental"]
+STRATA = [
+    "sex", "ageband_broad", "ethnicity6", "imd", "region", "urban", "shielded",
+    "prev_mental_dis",
+]
+LOCKDOWN = pd.Timestamp("2020-04-01")
+EVENTS = [pd.Timestamp(date) for date in ["2021-01-01", "2021-05-01", "2022-01-01"]]
+
+
+@dataclass
+class Chart:
+    name: str
+    measure_id: str
+    per: int = 100_000
+    ylabel: str = "Rate per 100,000"
+    start: str = None
+    rounding: str = None
+
+
+def study_charts():
+    """Return the charts drawn by lines.do and self_harm_graph.do."""
+    charts = []
+    for outcome in OUTCOMES:
+        charts.append(Chart(f"lines_{outcome}", f"{outcome}_rate"))
+        for stratum in STRATA:
+            charts.append(Chart(f"lines_{outcome}_{stratum}", f"{outcome}_{stratum}"))
+    charts.append(
+        Chart(
+            "line_selfharmmort",
+            "self_harmDeath_rate",
+            per=1_000_000,
+            ylabel="Rate per million",
+            start="2019-03-01",
+            rounding="midpoint7",
+        )
+    )
+    return charts
+
+
+def chart_data(chart, frame, group_by):
+    """Return the chart's series: date, group and rate, one row per group per month."""
+    frame = frame.dropna(subset=group_by)
+    if chart.start:
+        frame = frame[pd.to_datetime(frame["date"]) >= pd.Timestamp(chart.start)]
+    labels, groups = group_labels(frame, group_by)
+    numerator, denominator = frame.columns[len(group_by)], frame.columns[len(group_by) + 1]
+    value = frame["value"]
+    if chart.rounding:
+        scheme = rounding_scheme(chart.rounding)
+        value = scheme(frame[numerator].to_numpy()) / scheme(frame[denominator].to_numpy())
+    data = pd.DataFrame(
+        {
+            "date": pd.to_datetime(frame["date"]).to_numpy(),
+            "group": pd.Categorical(labels, categories=groups),
+            "rate": value * chart.per,
+        }
+    )
+    return data.sort_values(["group", "date"], kind="stable").reset_index(drop=True)
+
+
+def render(task):
+    """Draw one chart, with a panel per group, to an SVG file."""
+    chart, data, path = task
+    groups = list(data["group"].cat.categories)
+    columns = math.ceil(math.sqrt(len(groups)))
+    rows = math.ceil(len(groups) / columns)
+    fig, axes = plt.subplots(
+        rows, columns, sharex=True, sharey=True, squeeze=False,
+        figsize=(3.5 * columns, 2.8 * rows),
+    )
+    for ax, group in zip(axes.flat, groups):
+        series = data[data["group"] == group]
+        ax.plot(series["date"], series["rate"])
+        ax.axvline(LOCKDOWN, color="black", linewidth=0.8)
+        for date in EVENTS:
+            ax.axvline(date, color="green", linestyle=":", linewidth=0.8)
+        ax.set_title(group, fontsize="small")
+        ax.yaxis.set_major_formatter(matplotlib.ticker.StrMethodFormatter("{x:,.0f}"))
+        ax.xaxis.set_major_formatter(matplotlib.dates.DateFormatter("%b-%Y"))
+        ax.tick_params(axis="x", labelrotation=45)
+    for i in range(len(groups), rows * columns):
+        axes.flat[i].set_visible(False)
+        # label the dates on the panel above an empty one
+        axes.flat[i - columns].tick_params(axis="x", labelbottom=True)
+    for ax in axes[:, 0]:
+        ax.set_ylabel(chart.ylabel)
+    fig.tight_layout()
+    with atomic_path(path) as temporary:
+        fig.savefig(temporary, format="svg")
+    plt.close(fig)
+    return path.name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--registry", type=Path, default=Path("output/measures/registry"))
+    parser.add_argument("--store", type=Path, default=Path("output/measures/measures.parquet"))
+    parser.add_argument("--measures-dir", type=Path, default=Path("output/measures"))
+    parser.add_argument(
+        "--study-definition", type=Path, default=Path("analysis/study_definition.py")
+    )
+    parser.add_argument("--output-dir", type=Path, default=Path("output/charts"))
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    charts = study_charts()
+    wanted = {chart.measure_id for chart in charts}
+    measures = {
+        measure_id: (group_by, frame)
+        for measure_id, group_by, frame in iter_measures(
+            args.store, args.measures_dir, args.study_definition, args.registry
+        )
+        if measure_id in wanted
+    }
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    tasks = []
+    for chart in charts:
+        group_by, frame = measures[chart.measure_id]
+        data = chart_data(chart, frame, group_by)
+        tasks.append((chart, data, args.output_dir / f"{chart.name}.svg"))
+
+    workers = worker_count(args.workers, args.memory_budget, tasks=len(tasks))
+    for _ in map_tasks(render, tasks, workers, label=lambda task: task[2].name):
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Track which monthly cohorts are up to date with the study definition.
+
+`generate_study_population` runs with `--skip-existing`, so cohortextractor only
+extracts months that have no `input_<date>.feather` yet. That is only safe if the files
+that are already there were produced by the current study definition and codelists.
+
+Each month gets a fingerprint made from the study definition source, the codelist
+module, the codelist SHAs in `codelists/codelists.json` and the index date. The
+fingerprints of the extracted months are kept in a manifest next to the cohorts, with a
+hash of each cohort file. `record` (the `record_cohort_fingerprints` action) only
+fingerprints a month whose file is new or has changed since it was last recorded, that
+is, one extracted by this run, and whose columns are the study definition's variables.
+A month left over from an older study definition keeps its old fingerprint, and
+`join_static.py` and `measures.py` refuse to use a month that is stale or unrecorded
+(`--fingerprints`).
+
+Usage, from the repository root:
+
+    python analysis/cohort_fingerprints.py status   # list missing and stale months
+    python analysis/cohort_fingerprints.py prune    # delete stale cohorts
+    opensafely run generate_study_population
+    python analysis/cohort_fingerprints.py record   # fingerprint what was extracted
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import re
+from pathlib import Path
+
+import pyarrow as pa
+
+from cohort_io import study_schema
+
+STUDY_DEFINITION = Path("analysis/study_definition.py")
+CODELIST_MODULE = Path("analysis/codelists.py")
+CODELIST_MANIFEST = Path("codelists/codelists.json")
+PROJECT = Path("project.yaml")
+ACTION = "generate_study_population"
+COHORT_DIR = Path("output/cohorts")
+MANIFEST = COHORT_DIR / "cohort_fingerprints.json"
+
+
+def index_dates(project=PROJECT, action=ACTION):
+    """Return the index dates requested by `action` in project.yaml."""
+    text = project.read_text()
+    block = re.search(rf"^\s*{action}:\s*\n\s*run:(.*)$", text, re.MULTILINE)
+    if block is None:
+        raise ValueError(f"No action {action} in {project}")
+    date_range = re.search(r'--index-date-range[ =]"([^"]+)"', block.group(1))
+    if date_range is None:
+        raise ValueError(f"{action} has no --index-date-range")
+    return expand_date_range(date_range.group(1))
+
+
+def expand_date_range(date_range):
+    """Expand a cohortextractor "<start> to <end> by month" string."""
+    if " to " not in date_range:
+        return [date_range.strip()]
+    start, end = date_range.split(" to ")
+    end, _, period = end.partition(" by ")
+    if (period.strip() or "month") != "month":
+        raise ValueError(f"Only monthly ranges are supported, not {date_range!r}")
+    current = datetime.date.fromisoformat(start.strip())
+    end = datetime.date.fromisoformat(end.strip())
+    dates = []
+    while current <= end:
+        dates.append(current.isoformat())
+        month = current.month % 12 + 1
+        current = current.replace(year=current.year + (month == 1), month=month)
+    return dates
+
+
+def definition_digest():
+    """Hash everything that affects a cohort other than its index date."""
+    digest = hashlib.sha256()
+    digest.update(STUDY_DEFINITION.read_bytes())
+    digest.update(CODELIST_MODULE.read_bytes())
+    codelists = json.loads(CODELIST_MANIFEST.read_text())["files"]
+    for name in sorted(codelists):
+        digest.update(f"{name}={codelists[name]['sha']}\n".encode())
+    return digest.hexdigest()
+
+
+def fingerprint(index_date, digest=None):
+    digest = digest or definition_digest()
+    return hashlib.sha256(f"{digest}:{index_date}".encode()).hexdigest()
+
+
+def cohort_path(index_date):
+    return COHORT_DIR / f"input_{index_date}.feather"
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path=MANIFEST):
+    """Return {index date: {"fingerprint", "file_hash"}} for the recorded months."""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def month_status(dates):
+    """Classify each index date as current, stale or missing."""
+    digest = definition_digest()
+    recorded = load_manifest()
+    status = {}
+    for index_date in dates:
+        if not cohort_path(index_date).exists():
+            status[index_date] = "missing"
+        elif recorded.get(index_date, {}).get("fingerprint") != fingerprint(index_date, digest):
+            status[index_date] = "stale"
+        else:
+            status[index_date] = "current"
+    return status
+
+
+def unverified_months(dates, manifest=MANIFEST):
+    """Return {index date: "stale" or "unrecorded"} for the months that are not current."""
+    digest = definition_digest()
+    recorded = load_manifest(manifest)
+    unverified = {}
+    for index_date in dates:
+        if index_date not in recorded:
+            unverified[index_date] = "unrecorded"
+        elif recorded[index_date]["fingerprint"] != fingerprint(index_date, digest):
+            unverified[index_date] = "stale"
+    return unverified
+
+
+def check_months(dates, manifest=MANIFEST):
+    """Raise ValueError if any of `dates` was not extracted by the current definition."""
+    unverified = unverified_months(dates, manifest)
+    if unverified:
+        months = ", ".join(f"{index_date} ({state})" for index_date, state in unverified.items())
+        raise ValueError(
+            f"Cohorts not extracted by the current study definition: {months}. Delete them "
+            "(cohort_fingerprints.py prune) and run generate_study_population again."
+        )
+
+
+def cohort_columns(path):
+    with pa.memory_map(str(path)) as source:
+        return pa.ipc.open_file(source).schema.names
+
+
+def record(dates):
+    """Fingerprint the months extracted since the last record, returning the manifest.
+
+    A month that is unchanged since it was recorded keeps its fingerprint, even if it
+    is stale. A new or changed file is fingerprinted with the current definition only
+    if its columns are the study definition's variables.
+    """
+    digest = definition_digest()
+    recorded = load_manifest()
+    variables = set(study_schema(STUDY_DEFINITION))
+    manifest = {}
+    for index_date in dates:
+        path = cohort_path(index_date)
+        if not path.exists():
+            continue
+        hashed = file_hash(path)
+        entry = recorded.get(index_date)
+        if entry and entry["file_hash"] == hashed:
+            manifest[index_date] = entry
+        elif set(cohort_columns(path)) == variables:
+            manifest[index_date] = {
+                "fingerprint": fingerprint(index_date, digest),
+                "file_hash": hashed,
+            }
+            print(f"recorded {index_date}")
+        else:
+            print(f"{index_date}: columns do not match {STUDY_DEFINITION}, not recorded")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["status", "prune", "record"])
+    args = parser.parse_args()
+
+    dates = index_dates()
+    status = month_status(dates)
+
+    if args.command == "status":
+        for index_date, state in status.items():
+            if state != "current":
+                print(f"{index_date}: {state}")
+        todo = sum(state != "current" for state in status.values())
+        print(f"{todo} of {len(dates)} months need extracting")
+
+    elif args.command == "prune":
+        for index_date, state in status.items():
+            if state == "stale":
+                cohort_path(index_date).unlink()
+                print(f"removed stale cohort for {index_date}")
+
+    elif args.command == "record":
+        manifest = record(dates)
+        MANIFEST.write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n")
+        stale = unverified_months(list(manifest))
+        print(f"{len(manifest) - len(stale)} of {len(dates)} months current, {len(stale)} stale")
+
+
+if __name__ == "__main__":
+    main()
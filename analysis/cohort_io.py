@@ -0,0 +1,209 @@
+"""Read and write the cohort files passed between actions.
+
+Cohorts are stored as Arrow (feather) files: binary flags are stored as int8 and the
+categorical variables are dictionary-encoded, so a value like "not living alone" is
+stored once per file rather than once per row. CSV files are still read and written,
+for the cohorts that are passed to Stata.
+
+Each cohort written here has a schema sidecar, `<name>.schema.json`, giving the type of
+every column: flag, int, float, category or date. The types come from the variables'
+`return_expectations` and `returning` arguments in the study definitions. `read_cohort`
+uses the sidecar to parse each column straight into a compact dtype, rather than
+letting pandas load flags as int64 and categories as Python objects.
+"""
+
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+
+from study_parser import load_study
+
+FORMATS = {".csv": "csv", ".feather": "feather"}
+
+FLAG = "flag"
+INT = "int"
+FLOAT = "float"
+CATEGORY = "category"
+DATE = "date"
+
+# the column type of each cohortextractor `returning` value
+RETURNING_TYPES = {
+    "binary_flag": FLAG,
+    "has_members_in_other_ehr_systems": FLAG,
+    "has_members_with_data_in_this_backend": FLAG,
+    "date": DATE,
+    "first_date_in_period": DATE,
+    "last_date_in_period": DATE,
+    "date_admitted": DATE,
+    "date_discharged": DATE,
+    "date_of_death": DATE,
+    "number_of_matches_in_period": INT,
+    "number_of_episodes": INT,
+    "pseudo_id": INT,
+    "household_size": INT,
+    "percentage_of_members_with_data_in_this_backend": INT,
+    "index_of_multiple_deprivation": INT,
+    "numeric_value": FLOAT,
+    "category": CATEGORY,
+    "code": CATEGORY,
+    "primary_diagnosis": CATEGORY,
+    "nuts1_region_name": CATEGORY,
+    "rural_urban_classification": CATEGORY,
+    "msoa": CATEGORY,
+    "stp_code": CATEGORY,
+}
+# the column type of functions whose type does not depend on `returning`
+FUNCTION_TYPES = {
+    "categorised_as": CATEGORY,
+    "sex": CATEGORY,
+    "date_of": DATE,
+    "age_as_of": INT,
+}
+
+
+def variable_type(variable):
+    """Work out a variable's column type from its definition.
+
+    `returning` decides the type where it is given, then the function (a variable with
+    `categorised_as` is a category); `return_expectations` is only a fallback, since a
+    flag's expectations may still include a date range.
+    """
+    returning = variable.returning
+    if returning in RETURNING_TYPES:
+        return RETURNING_TYPES[returning]
+    if "categorised_as" in variable.kwargs:
+        return CATEGORY
+    if variable.function in FUNCTION_TYPES:
+        return FUNCTION_TYPES[variable.function]
+    if returning and returning.startswith("date"):
+        return DATE
+    if returning:
+        return FLAG
+    expectations = variable.return_expectations
+    for key, type_ in [("category", CATEGORY), ("float", FLOAT), ("int", INT), ("date", DATE)]:
+        if key in expectations:
+            return type_
+    return FLAG
+
+
+def study_schema(*study_paths):
+    """Return {column: type} for the variables in the given study definitions."""
+    schema = {"patient_id": INT}
+    for path in study_paths:
+        for name, variable in load_study(path).variables.items():
+            schema[name] = variable_type(variable)
+    return schema
+
+
+def schema_path(path):
+    path = Path(path)
+    return path.with_name(f"{path.stem}.schema.json")
+
+
+def read_schema(path):
+    sidecar = schema_path(path)
+    if not sidecar.exists():
+        return {}
+    return json.loads(sidecar.read_text())["columns"]
+
+
+def write_schema(path, schema, columns):
+    sidecar = {"columns": {column: schema[column] for column in columns if column in schema}}
+    with atomic_path(schema_path(path)) as tmp:
+        tmp.write_text(json.dumps(sidecar, indent=2) + "\n")
+
+
+@contextmanager
+def atomic_path(path):
+    """Yield a temporary path to write to, then rename it to `path`.
+
+    The temporary file starts with a dot, so it never matches `cohort_files`, and a
+    cohort is never seen half-written by another process.
+    """
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.tmp")
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def cohort_files(directory, prefix="input_"):
+    """Return the cohort files in `directory`, in name order."""
+    return sorted(
+        path for path in Path(directory).glob(f"{prefix}*") if path.suffix in FORMATS
+    )
+
+
+def read_cohort(path, columns=None, schema=None):
+    """Read a cohort, using `schema` or else the cohort's schema sidecar for its dtypes."""
+    path = Path(path)
+    schema = schema or read_schema(path)
+    if path.suffix == ".feather":
+        return compact_dtypes(pd.read_feather(path, columns=columns), schema)
+    header = columns or pd.read_csv(path, nrows=0).columns
+    types = {column: schema[column] for column in header if column in schema}
+    dtypes = {column: "category" for column, type_ in types.items() if type_ == CATEGORY}
+    dates = [column for column, type_ in types.items() if type_ == DATE]
+    frame = pd.read_csv(path, usecols=columns, dtype=dtypes, parse_dates=dates)
+    return compact_dtypes(frame, schema)
+
+
+def iter_cohort(path, columns, chunk_rows=100_000):
+    """Read a cohort in chunks of at most `chunk_rows` rows.
+
+    Feather files are memory-mapped and sliced without copying, so only the chunk being
+    converted to pandas is held in memory.
+    """
+    path = Path(path)
+    schema = read_schema(path)
+    if path.suffix == ".feather":
+        with pa.memory_map(str(path)) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = pa.Table.from_batches([reader.get_batch(i)]).select(columns)
+                for offset in range(0, batch.num_rows, chunk_rows):
+                    chunk = batch.slice(offset, chunk_rows).to_pandas()
+                    yield compact_dtypes(chunk, schema)
+    else:
+        types = {column: schema[column] for column in columns if column in schema}
+        dtypes = {column: "category" for column, type_ in types.items() if type_ == CATEGORY}
+        for chunk in pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=chunk_rows):
+            yield compact_dtypes(chunk, schema)
+
+
+def compact_dtypes(frame, schema):
+    """Convert each column to the smallest dtype for its type in `schema`."""
+    for column in frame.columns:
+        type_ = schema.get(column)
+        values = frame[column]
+        if type_ == CATEGORY:
+            frame[column] = values.astype("category")
+        elif type_ == FLAG and not values.isna().any():
+            frame[column] = values.astype("int8")
+        elif type_ == INT and not values.isna().any():
+            frame[column] = pd.to_numeric(values, downcast="integer")
+        elif type_ in (INT, FLOAT):
+            frame[column] = pd.to_numeric(values, downcast="float")
+        elif type_ == DATE:
+            frame[column] = pd.to_datetime(values)
+    return frame
+
+
+def write_cohort(frame, path, schema):
+    """Write a cohort and its schema sidecar, each atomically, the sidecar first."""
+    path = Path(path)
+    write_schema(path, schema, frame.columns)
+    with atomic_path(path) as tmp:
+        if path.suffix == ".feather":
+            compact_dtypes(frame, schema).reset_index(drop=True).to_feather(
+                tmp, compression="zstd"
+            )
+        else:
+            frame.to_csv(tmp, index=False)
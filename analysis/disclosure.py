@@ -0,0 +1,213 @@
+"""Suppress and round the counts in every measure for release.
+
+`analysis/self_harm_graph.do` rounds the numerator and denominator of
+`measure_self_harmDeath_rate.csv` to the midpoint of bands of 7 before recalculating the
+rate. This applies a rounding scheme to the numerators and denominators of all the
+measures together, as two integer arrays over the whole measures store, recalculates
+each rate from the rounded counts (as `value`, and per 100,000 and per million) and
+writes a rounded copy of every `measure_<id>.csv` to the output directory.
+
+With `--threshold`, small counts are suppressed first, on the unrounded counts: every
+row with a numerator or denominator from 1 to threshold - 1 is blanked (primary
+suppression). A blanked cell could be recovered from a total, e.g. the living-alone
+cell for women in `<outcome>_sex` from the living-alone total in `<outcome>_rate`. So for
+each measure, date and group-by column, the cells that add up across that column (such
+as the women and men living alone) are checked, and where exactly one of them is
+suppressed the next smallest is suppressed too (secondary suppression). This repeats
+until no cell is alone in being suppressed. Each pass is a few NumPy operations over the
+whole store, with the cells numbered by group.
+
+Schemes:
+
+- `midpoint7`: 0 stays 0, 1-7 becomes 4, 8-14 becomes 11, and so on, as in
+  self_harm_graph.do. `midpoint<N>` rounds to the midpoint of bands of N.
+- `round5`: to the nearest multiple of 5, halves rounding up. `round<N>` rounds to the
+  nearest multiple of N.
+
+Usage:
+
+    python analysis/disclosure.py [--store output/measures/measures.parquet]
+                                  [--measures-dir output/measures]
+                                  [--study-definition analysis/study_definition.py]
+                                  [--threshold 8] [--scheme midpoint7]
+                                  [--output-dir output/measures/sdc]
+"""
+
+import argparse
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from measures_store import MeasureStore, long_format
+from study_parser import load_measures
+
+SCHEME = re.compile(r"^(?P<kind>midpoint|round)(?P<base>\d+)$")
+COUNTS = ["numerator", "denominator"]
+RATES = {"rate_per_100k": 100_000, "rate_per_million": 1_000_000}
+
+
+def midpoint(counts, base=7):
+    """Round to the midpoint of bands of `base`: 1..base -> base // 2 + 1, 0 stays 0."""
+    return np.where(counts == 0, 0, -(-counts // base) * base - base // 2)
+
+
+def nearest(counts, base=5):
+    """Round to the nearest multiple of `base`, halves rounding up."""
+    return (counts + base // 2) // base * base
+
+
+def rounding_scheme(name):
+    """Return the function for a scheme name such as "midpoint7" or "round5"."""
+    match = SCHEME.match(name)
+    if not match or int(match.group("base")) < 1:
+        raise ValueError(f"Unknown rounding scheme {name!r}: use midpoint<N> or round<N>")
+    function = midpoint if match.group("kind") == "midpoint" else nearest
+    base = int(match.group("base"))
+    return lambda counts: function(counts, base)
+
+
+def _complementary(suppressed, numerator, cells):
+    """Suppress the smallest other cell of each group with exactly one cell suppressed.
+
+    `cells` numbers each row's group. Returns whether any cell was added.
+    """
+    size = np.bincount(cells)
+    alone = (np.bincount(cells, weights=suppressed) == 1) & (size > 1)
+    candidates = np.flatnonzero(alone[cells] & ~suppressed)
+    if not len(candidates):
+        return False
+    candidates = candidates[np.lexsort((numerator[candidates], cells[candidates]))]
+    _, first = np.unique(cells[candidates], return_index=True)
+    suppressed[candidates[first]] = True
+    return True
+
+
+def suppress(measures, threshold):
+    """Return which rows of a long-format measures table to suppress.
+
+    Returns the rows suppressed (primary and secondary) and the number of primary rows.
+    """
+    counts = measures[COUNTS].to_numpy(dtype=np.int64)
+    suppressed = ((counts > 0) & (counts < threshold)).any(axis=1)
+    primary = int(suppressed.sum())
+    group_columns = [
+        column for column in measures.columns
+        if column not in ["measure_id", "date", *COUNTS, "value"]
+    ]
+    # for each group-by column, number the sets of cells that add up across it; other
+    # measures' group-by columns are empty and so leave their rows in sets of one
+    cells = [
+        measures.groupby(
+            ["measure_id", "date", *[other for other in group_columns if other != column]],
+            dropna=False,
+            sort=False,
+        ).ngroup().to_numpy()
+        for column in group_columns
+    ]
+    return suppress_complementary(suppressed, counts[:, 0], cells), primary
+
+
+def suppress_complementary(suppressed, counts, cell_sets):
+    """Suppress more cells until no set of cells has exactly one suppressed.
+
+    Each array in `cell_sets` numbers the set each row belongs to; the smallest other
+    cell by `counts` is suppressed with a lone one. `suppressed` is updated in place.
+    """
+    while any([_complementary(suppressed, counts, cells) for cells in cell_sets]):
+        pass
+    return suppressed
+
+
+def round_measures(measures, scheme, suppressed=None):
+    """Round the counts and recalculate the rates in a long-format measures table.
+
+    Rows marked in `suppressed` have their counts and rates blanked.
+    """
+    measures = measures.copy()
+    if suppressed is None:
+        suppressed = np.zeros(len(measures), dtype=bool)
+    for column in COUNTS:
+        rounded = scheme(measures[column].to_numpy(dtype=np.int64))
+        measures[column] = pd.array(rounded, dtype="Int64")
+        measures.loc[suppressed, column] = pd.NA
+    numerator = measures["numerator"].to_numpy(dtype=float, na_value=np.nan)
+    denominator = measures["denominator"].to_numpy(dtype=float, na_value=np.nan)
+    measures["value"] = np.divide(
+        numerator, denominator, out=np.full(len(measures), np.nan), where=denominator > 0
+    )
+    for column, per in RATES.items():
+        measures[column] = measures["value"] * per
+    return measures
+
+
+def read_measures(store, measures_dir, study_definition):
+    """Return every measure as one long-format table, and the measure definitions."""
+    if store and store.exists():
+        store = MeasureStore(store)
+        return store.read_all(), store.definitions
+    measures = load_measures(study_definition)
+    frames = [
+        long_format(measure, pd.read_csv(measures_dir / f"measure_{measure.id}.csv"))
+        for measure in measures
+    ]
+    definitions = {
+        measure.id: {
+            "numerator": measure.numerator,
+            "denominator": measure.denominator,
+            "group_by": measure.group_by,
+        }
+        for measure in measures
+    }
+    return pd.concat(frames, ignore_index=True), definitions
+
+
+def write_measures(measures, definitions, output_dir):
+    """Write one `measure_<id>.csv` per measure, with the columns of the original."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    measures["date"] = pd.to_datetime(measures["date"]).dt.strftime("%Y-%m-%d")
+    for measure_id, frame in measures.groupby("measure_id", sort=False):
+        definition = definitions[measure_id]
+        columns = [*definition["group_by"], *COUNTS, "value", *RATES, "date"]
+        frame[columns].rename(
+            columns={
+                "numerator": definition["numerator"],
+                "denominator": definition["denominator"],
+            }
+        ).to_csv(output_dir / f"measure_{measure_id}.csv", index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", type=Path, default=Path("output/measures/measures.parquet"))
+    parser.add_argument("--measures-dir", type=Path, default=Path("output/measures"))
+    parser.add_argument(
+        "--study-definition", type=Path, default=Path("analysis/study_definition.py")
+    )
+    parser.add_argument(
+        "--threshold", type=int, help="suppress counts from 1 to THRESHOLD - 1"
+    )
+    parser.add_argument("--scheme", default="midpoint7", help="midpoint<N> or round<N>")
+    parser.add_argument("--output-dir", type=Path, default=Path("output/measures/sdc"))
+    args = parser.parse_args()
+
+    scheme = rounding_scheme(args.scheme)
+    measures, definitions = read_measures(args.store, args.measures_dir, args.study_definition)
+    suppressed = None
+    if args.threshold:
+        suppressed, primary = suppress(measures, args.threshold)
+        print(
+            f"Suppressed {suppressed.sum()} of {len(measures)} rows: {primary} below "
+            f"{args.threshold}, {suppressed.sum() - primary} to protect them"
+        )
+    measures = round_measures(measures, scheme, suppressed)
+    write_measures(measures, definitions, args.output_dir)
+    print(
+        f"{args.output_dir}: {measures['measure_id'].nunique()} measures, "
+        f"{len(measures)} rows rounded with {args.scheme}"
+    )
+
+
+if __name__ == "__main__":
+    main()
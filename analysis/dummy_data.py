@@ -0,0 +1,191 @@
+"""Generate large dummy cohorts from a study definition's return expectations.
+
+cohortextractor generates dummy data row by row, which is why project.yaml keeps
+`population_size` at 1000. This generator draws each column with one vectorised numpy
+call, so it can produce cohorts of millions of patients in seconds to load-test
+`measures.py`, `report.py` and the other Python actions at production scale.
+
+The study definition is read with `study_parser`, and each variable is drawn from its
+`return_expectations` merged with the `default_expectations`, as cohortextractor does:
+`category` ratios, `int` and `float` distributions (`population_ages`, `normal`,
+`uniform`), `date` ranges and `incidence`. `satisfying` variables with no expectations
+of their own are evaluated from their components, so e.g. `self_harm` is set whenever
+one of `self_harm_gp`, `self_harm_hosp`, `self_harm_emerg` or `self_harm_death` is. As
+with cohortextractor, the population definition is not applied.
+
+Each variable is drawn from its own seeded generator, keyed by the seed, the variable
+name and the index date, so output is reproducible and adding a variable does not
+change the others. Patient IDs run from 1 to `--size`, so cohorts generated from the
+monthly and static study definitions can be joined with `join_static.py`.
+
+Usage:
+
+    python analysis/dummy_data.py --size 10000000 --output-dir output/dummy
+        [--study-definition analysis/study_definition.py]
+        [--index-date-range "2020-01-01 to 2020-12-01 by month"] [--seed 0]
+        [--workers N] [--memory-budget MB]
+
+    python analysis/dummy_data.py --size 10000000 --output-dir output/dummy/static
+        --study-definition analysis/study_definition_static.py --name input_static
+"""
+
+import argparse
+import re
+import zlib
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cohort_fingerprints import expand_date_range
+from cohort_io import CATEGORY, DATE, FLAG, study_schema, write_cohort
+from parallel import add_arguments, map_tasks, worker_count
+from study_parser import load_study, resolve_date
+
+# share of the population in each 10-year age band from 0-9 to 100-109, approximating
+# the ONS mid-year estimates that cohortextractor's "population_ages" distribution uses
+POPULATION_AGE_BANDS = [
+    0.120, 0.115, 0.130, 0.133, 0.128, 0.135, 0.107, 0.085, 0.040, 0.008, 0.001,
+]
+
+
+def variable_rng(seed, name, index_date):
+    return np.random.default_rng([seed, zlib.crc32(f"{name}@{index_date}".encode())])
+
+
+def expectations_for(variable, default_expectations):
+    own = variable.return_expectations
+    expectations = {**default_expectations, **own}
+    if "rate" in own and own["rate"] == "universal":
+        expectations["incidence"] = 1
+    elif "incidence" not in own and "category" in own:
+        expectations["incidence"] = 1
+    return expectations
+
+
+def draw_ints(rng, spec, size):
+    distribution = spec.get("distribution", "uniform")
+    if distribution == "population_ages":
+        weights = np.array(POPULATION_AGE_BANDS) / sum(POPULATION_AGE_BANDS)
+        bands = rng.choice(len(weights), size=size, p=weights)
+        return bands * 10 + rng.integers(0, 10, size=size)
+    if distribution == "normal":
+        return np.rint(rng.normal(spec["mean"], spec["stddev"], size=size)).astype(np.int64)
+    return rng.integers(spec.get("min", 0), spec.get("max", 100), size=size, endpoint=True)
+
+
+def draw_dates(rng, spec, size, index_date, date_format):
+    earliest = np.datetime64(resolve_date(spec.get("earliest", "1900-01-01"), index_date))
+    latest = np.datetime64(resolve_date(spec.get("latest", "today"), index_date))
+    days = rng.integers(0, (latest - earliest).astype(int), size=size, endpoint=True)
+    dates = earliest + days.astype("timedelta64[D]")
+    if date_format == "YYYY-MM":
+        dates = dates.astype("datetime64[M]").astype("datetime64[D]")
+    elif date_format == "YYYY":
+        dates = dates.astype("datetime64[Y]").astype("datetime64[D]")
+    return pd.Series(dates).astype("datetime64[ns]")
+
+
+def evaluate(expression, frame, schema):
+    """Evaluate a cohortextractor logic expression over the generated columns."""
+    expression = re.sub(r"\bAND\b", "&", expression)
+    expression = re.sub(r"\bOR\b", "|", expression)
+    expression = re.sub(r"\bNOT\b", "~", expression)
+    expression = re.sub(r"(?<![<>!=])=(?!=)", "==", expression)
+    names = set(re.findall(r"[A-Za-z_]\w*", expression))
+    columns = {
+        name: (frame[name] == 1 if schema.get(name) == FLAG else frame[name])
+        for name in names
+        if name in frame
+    }
+    return pd.eval(" ".join(expression.split()), local_dict=columns, engine="python")
+
+
+def draw_variable(variable, frame, study, schema, size, rng, index_date):
+    type_ = schema[variable.name]
+    expectations = expectations_for(variable, study.default_expectations)
+    if (
+        variable.function == "satisfying"
+        and not variable.return_expectations
+        and variable.args
+    ):
+        return np.asarray(evaluate(variable.args[0], frame, schema)).astype(np.int8)
+
+    present = rng.random(size, dtype=np.float32) < expectations.get("incidence", 1)
+    if type_ == FLAG:
+        return present.astype(np.int8)
+    if type_ == CATEGORY:
+        ratios = expectations.get("category", {}).get("ratios") or {"": 1}
+        categories = [str(category) for category in ratios]
+        weights = np.array(list(ratios.values()), dtype=float)
+        codes = rng.choice(len(categories), size=size, p=weights / weights.sum())
+        codes[~present] = -1
+        return pd.Categorical.from_codes(codes, categories=pd.Index(categories).unique())
+    if type_ == DATE:
+        dates = draw_dates(
+            rng,
+            expectations.get("date", {}),
+            size,
+            index_date,
+            variable.kwargs.get("date_format", "YYYY-MM-DD"),
+        )
+        return dates.where(present).to_numpy()
+    spec = expectations.get("int") or expectations.get("float") or {}
+    values = draw_ints(rng, spec, size)
+    return np.where(present, values, 0)
+
+
+def generate(study_path, size, index_date=None, seed=0):
+    study = load_study(study_path)
+    index_date = index_date or study.index_date
+    schema = study_schema(study_path)
+    frame = {"patient_id": np.arange(1, size + 1, dtype=np.int64)}
+    for name, variable in study.variables.items():
+        rng = variable_rng(seed, name, index_date)
+        frame[name] = draw_variable(variable, frame, study, schema, size, rng, index_date)
+    return pd.DataFrame(frame), schema
+
+
+# bytes per patient of a generated monthly cohort while it is being written
+MEMORY_PER_PATIENT = 160
+
+
+def generate_month(index_date, args):
+    cohort, schema = generate(args.study_definition, args.size, index_date, args.seed)
+    name = args.name or f"input_{index_date or load_study(args.study_definition).index_date}"
+    output = args.output_dir / f"{name}.{args.output_format}"
+    write_cohort(cohort, output, schema)
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--study-definition", type=Path, default=Path("analysis/study_definition.py")
+    )
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--index-date-range", help='e.g. "2020-01-01 to 2020-12-01 by month"')
+    parser.add_argument("--output-dir", type=Path, required=True)
+    parser.add_argument("--output-format", choices=["feather", "csv"], default="feather")
+    parser.add_argument("--name", help="file name for a single cohort, e.g. input_static")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    dates = expand_date_range(args.index_date_range) if args.index_date_range else [None]
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    workers = worker_count(
+        args.workers, args.memory_budget, args.size * MEMORY_PER_PATIENT / 2**20, len(dates)
+    )
+    for _, output in map_tasks(
+        partial(generate_month, args=args),
+        dates,
+        workers,
+        label=lambda index_date: f"{index_date or 'index date'}: {args.size} patients",
+    ):
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
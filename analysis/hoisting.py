@@ -0,0 +1,131 @@
+"""Classify study definition variables by how they depend on the index date.
+
+Each variable is classified from its date arguments and the variables it refers to:
+
+- per-window: refers to `index_date`, directly or through another variable, so it has
+  to be extracted for every index date;
+- static: only uses fixed dates, or no dates at all, e.g. sex or household size as of
+  2020-02-01;
+- slowly-changing: searches a patient's whole record with no date limits, e.g. the last
+  recorded ethnicity. The value only changes when new records arrive, so it is the
+  same for every index date within a run.
+
+Static and slowly-changing variables are hoisted into `study_definition_static.py`,
+extracted once per run and joined onto every month. This script reports the hoisted
+variables and how many variable evaluations that saves, flags variables in the monthly
+definitions that could be hoisted, and fails if the static definition refers to
+`index_date`.
+
+Usage, from the repository root:
+
+    python analysis/hoisting.py
+"""
+
+import re
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+from cohort_fingerprints import PROJECT, expand_date_range
+from study_parser import load_study
+
+STATIC_DEFINITION = "study_definition_static"
+
+PER_WINDOW = "per-window"
+STATIC = "static"
+SLOWLY_CHANGING = "slowly-changing"
+
+# functions that search a patient's events, and so cover their whole record when
+# they are given no date limits
+EVENT_FUNCTIONS = {
+    "with_these_clinical_events",
+    "with_these_medications",
+    "admitted_to_hospital",
+    "attended_emergency_care",
+    "with_these_codes_on_death_certificate",
+    "died_from_any_cause",
+}
+DATE_LIMITS = {"between", "on_or_before", "on_or_after"}
+
+
+def classify(study):
+    """Return {variable name: class} for every variable in `study`."""
+    classes = {}
+
+    def visit(name):
+        if name in classes:
+            return classes[name]
+        variable = study.variables[name]
+        identifiers = variable.identifiers()
+        dependencies = [
+            other for other in identifiers | set(variable.children)
+            if other in study.variables and other != name
+        ]
+        dependency_classes = {visit(other) for other in dependencies}
+        if "index_date" in identifiers or PER_WINDOW in dependency_classes:
+            classes[name] = PER_WINDOW
+        elif SLOWLY_CHANGING in dependency_classes or (
+            variable.function in EVENT_FUNCTIONS
+            and not DATE_LIMITS & set(variable.kwargs)
+        ):
+            classes[name] = SLOWLY_CHANGING
+        else:
+            classes[name] = STATIC
+        return classes[name]
+
+    for name in study.variables:
+        visit(name)
+    return classes
+
+
+def extraction_runs(project=PROJECT):
+    """Return {study definition: number of index dates} for each generate_cohort action."""
+    runs = defaultdict(int)
+    for line in project.read_text().splitlines():
+        if "generate_cohort" not in line:
+            continue
+        definition = re.search(r"--study-definition[ =](\S+)", line).group(1)
+        date_range = re.search(r'--index-date-range[ =]"([^"]+)"', line)
+        runs[definition] += len(expand_date_range(date_range.group(1))) if date_range else 1
+    return runs
+
+
+def main():
+    runs = extraction_runs()
+    failed = False
+
+    static = load_study(Path("analysis") / f"{STATIC_DEFINITION}.py")
+    static_classes = classify(static)
+    print(f"Hoisted into {STATIC_DEFINITION} (extracted {runs[STATIC_DEFINITION]} time(s)):")
+    for name, variable_class in static_classes.items():
+        print(f"  {name:40} {variable_class}")
+        if variable_class == PER_WINDOW:
+            print(f"    ERROR: {name} depends on index_date and cannot be hoisted")
+            failed = True
+
+    evaluations_saved = 0
+    for definition, n_dates in runs.items():
+        if definition == STATIC_DEFINITION:
+            continue
+        study = load_study(Path("analysis") / f"{definition}.py")
+        classes = classify(study)
+        not_hoisted = [name for name, cls in classes.items() if cls != PER_WINDOW]
+        per_window = len(classes) - len(not_hoisted)
+        saved = len(static_classes) * n_dates
+        evaluations_saved += saved
+        print(
+            f"\n{definition}: {n_dates} index date(s), {per_window} per-window variables, "
+            f"{saved} hoisted variable evaluations avoided "
+            f"({saved / (saved + per_window * n_dates):.0%} of the variable evaluations)"
+        )
+        for name in not_hoisted:
+            print(f"  could be hoisted: {name} ({classes[name]})")
+
+    evaluations_saved -= len(static_classes) * runs[STATIC_DEFINITION]
+    print(f"\nNet variable evaluations saved per pipeline run: {evaluations_saved}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Fit the interrupted time-series model to every measure at once.
+
+`analysis/timeseries.do` and the sensitivity do-files fit, one measure at a time,
+
+    newey rate i.group##i.postcovid i.season, lag(1) force
+
+where `rate` is `value` per 100,000, `group` is `living_alone` crossed with the
+measure's stratum (if any), `postcovid` is 1 from 23/03/2020 and `season` is spring
+(March-May, the base level), summer, autumn or winter. This fits the same model to all
+the measures in a few batched NumPy operations and writes one table of coefficients,
+`coefficients.csv`, with a row per measure and term.
+
+Measures with the same number of groups and months have the same design, so they are
+stacked into arrays of shape (measures, groups, months, terms) and fitted together.
+Months with a missing rate are zero rows, which drop out of the fit. Standard errors are
+Newey-West with `--lag` lags (1 by default), as `newey` computes them for panel data:
+residual cross-products are taken within each group, weighted by 1 - lag / (lags + 1),
+and scaled by n / (n - k). t statistics, p-values and 95% confidence intervals use n - k
+degrees of freedom. As in Stata, the groups are ordered alphabetically, the first being
+the base level.
+
+The measures are read from the measure registry (see measure_registry.py) if it exists,
+or else from the measures store or the `measure_<id>.csv` files. Batches are fitted in a
+pool of worker processes.
+
+Usage:
+
+    python analysis/its.py [--registry output/measures/registry]
+                           [--store output/measures/measures.parquet]
+                           [--measures-dir output/measures]
+                           [--study-definition analysis/study_definition.py]
+                           [--output-dir output/its] [--lag 1]
+                           [--workers N] [--memory-budget MB]
+"""
+
+import argparse
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from measure_registry import GROUP, INDEX, MeasureRegistry
+from measures_store import MeasureStore
+from parallel import add_arguments, map_tasks, worker_count
+from study_parser import load_measures
+
+INTERRUPTION = pd.Timestamp("2020-03-23")
+SEASONS = {3: "Spring", 4: "Spring", 5: "Spring", 6: "Summer", 7: "Summer", 8: "Summer",
+           9: "Autumn", 10: "Autumn", 11: "Autumn"}
+SEASON_LEVELS = ["Spring", "Summer", "Autumn", "Winter"]
+RATE_PER = 100_000
+CONFIDENCE = 0.95
+FIELDS = [
+    "measure_id", "group_by", "term", "estimate", "std_error", "t", "p_value",
+    "ci_lower", "ci_upper", "n_obs", "df_resid",
+]
+
+
+def group_labels(frame, group_by):
+    """Return each row's group, and the groups in Stata's order.
+
+    timeseries.do concatenates the living_alone and stratum values, the smaller string
+    first, and `encode`s the result, which orders the groups alphabetically.
+    """
+    values = frame[group_by].astype(str)
+    labels = values.agg(", ".join, axis=1) if group_by else pd.Series("all", index=frame.index)
+    keys = values.apply(lambda row: "".join(sorted(row)), axis=1) if group_by else labels
+    order = pd.Series(keys.to_numpy(), index=labels.to_numpy()).drop_duplicates()
+    return labels, list(order.sort_values(kind="stable").index)
+
+
+def design(frame, group_by):
+    """Return the terms, the design array X (groups, months, terms) and the rates y."""
+    labels, groups = group_labels(frame, group_by)
+    dates = pd.to_datetime(frame["date"])
+    months = sorted(dates.unique())
+    rate = frame["value"].to_numpy(dtype=float) * RATE_PER
+    g = pd.Categorical(labels, categories=groups).codes
+    m = np.searchsorted(months, dates.to_numpy())
+
+    y = np.full((len(groups), len(months)), np.nan)
+    y[g, m] = rate
+    month_index = pd.DatetimeIndex(months)
+    postcovid = (month_index >= INTERRUPTION).astype(float)
+    season = month_index.month.map(lambda month: SEASONS.get(month, "Winter"))
+
+    terms = ["_cons"]
+    columns = [np.ones_like(y)]
+    for i, group in enumerate(groups[1:], 1):
+        terms.append(f"group[{group}]")
+        columns.append(np.broadcast_to(np.arange(len(groups))[:, None] == i, y.shape))
+    terms.append("postcovid")
+    columns.append(np.broadcast_to(postcovid, y.shape))
+    for i, group in enumerate(groups[1:], 1):
+        terms.append(f"group[{group}]#postcovid")
+        columns.append(columns[i] * postcovid)
+    for level in SEASON_LEVELS[1:]:
+        terms.append(f"season[{level}]")
+        columns.append(np.broadcast_to(np.asarray(season == level, dtype=float), y.shape))
+    X = np.stack(columns, axis=-1).astype(float)
+
+    # a missing rate is a zero row, which adds nothing to X'X, X'y or the residuals
+    missing = np.isnan(y)
+    X[missing] = 0
+    y[missing] = 0
+    return terms, X, y
+
+
+def newey_west(X, y, lags=1):
+    """Fit OLS with Newey-West standard errors to a batch of series.
+
+    `X` has shape (series, groups, months, terms) and `y` (series, groups, months), with
+    missing observations as zero rows. Returns the coefficients, standard errors, number
+    of observations and residual degrees of freedom, one row per series.
+    """
+    n = np.any(X != 0, axis=-1).sum(axis=(1, 2))
+    xtx = np.einsum("bgtk,bgtl->bkl", X, X)
+    bread = np.linalg.pinv(xtx, hermitian=True)
+    rank = np.linalg.matrix_rank(xtx, hermitian=True)
+    beta = np.einsum("bkl,bl->bk", bread, np.einsum("bgtk,bgt->bk", X, y))
+    residuals = y - np.einsum("bgtk,bk->bgt", X, beta)
+    scores = X * residuals[..., None]
+
+    meat = np.einsum("bgtk,bgtl->bkl", scores, scores)
+    for lag in range(1, lags + 1):
+        # within each group, month t with month t - lag
+        cross = np.einsum("bgtk,bgtl->bkl", scores[:, :, lag:], scores[:, :, :-lag])
+        meat += (1 - lag / (lags + 1)) * (cross + cross.transpose(0, 2, 1))
+
+    df_resid = n - rank
+    scale = n / np.maximum(df_resid, 1)
+    covariance = scale[:, None, None] * (bread @ meat @ bread)
+    std_error = np.sqrt(np.clip(np.diagonal(covariance, axis1=1, axis2=2), 0, None))
+    return beta, std_error, n, df_resid
+
+
+def fit_batch(batch, lags=1):
+    """Fit a list of (measure_id, group_by, terms, X, y) with the same design shape."""
+    X = np.stack([X for *_, X, _ in batch])
+    y = np.stack([y for *_, y in batch])
+    beta, std_error, n, df_resid = newey_west(X, y, lags)
+    t = np.divide(beta, std_error, out=np.full_like(beta, np.nan), where=std_error > 0)
+    df = np.maximum(df_resid, 1)[:, None]
+    p_value = 2 * stats.t.sf(np.abs(t), df)
+    margin = stats.t.ppf((1 + CONFIDENCE) / 2, df) * std_error
+
+    rows = []
+    for i, (measure_id, group_by, terms, _, _) in enumerate(batch):
+        rows.append(
+            pd.DataFrame(
+                {
+                    "measure_id": measure_id,
+                    "group_by": " x ".join(group_by),
+                    "term": terms,
+                    "estimate": beta[i],
+                    "std_error": std_error[i],
+                    "t": t[i],
+                    "p_value": p_value[i],
+                    "ci_lower": beta[i] - margin[i],
+                    "ci_upper": beta[i] + margin[i],
+                    "n_obs": n[i],
+                    "df_resid": df_resid[i],
+                }
+            )
+        )
+    return pd.concat(rows, ignore_index=True)
+
+
+def iter_measures(store, measures_dir, study_definition, registry=None):
+    """Yield (measure_id, group_by, DataFrame) for every measure.
+
+    The measures are read from the measure registry if there is one, else from the
+    measures store, else from the CSV files.
+    """
+    if registry and (registry / INDEX).exists():
+        registry = MeasureRegistry(registry)
+        for measure_id in registry.measure_ids:
+            arrays = registry.read(measure_id)
+            yield measure_id, arrays.group_by, arrays.frame()
+        return
+    if store and store.exists():
+        store = MeasureStore(store)
+        for measure_id in store.measure_ids:
+            yield measure_id, store.definitions[measure_id]["group_by"], store.read(measure_id)
+        return
+    for measure in load_measures(study_definition):
+        path = measures_dir / f"measure_{measure.id}.csv"
+        yield measure.id, measure.group_by, pd.read_csv(path, dtype={
+            column: str for column in measure.group_by
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--registry", type=Path, default=Path("output/measures/registry"))
+    parser.add_argument("--store", type=Path, default=Path("output/measures/measures.parquet"))
+    parser.add_argument("--measures-dir", type=Path, default=Path("output/measures"))
+    parser.add_argument(
+        "--study-definition", type=Path, default=Path("analysis/study_definition.py")
+    )
+    parser.add_argument("--output-dir", type=Path, default=Path("output/its"))
+    parser.add_argument("--lag", type=int, default=1)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    batches = {}
+    for measure_id, group_by, frame in iter_measures(
+        args.store, args.measures_dir, args.study_definition, args.registry
+    ):
+        if GROUP not in group_by:
+            continue
+        frame = frame.dropna(subset=group_by)
+        terms, X, y = design(frame, group_by)
+        batches.setdefault(X.shape, []).append((measure_id, group_by, terms, X, y))
+
+    workers = worker_count(args.workers, args.memory_budget, tasks=len(batches))
+    results = map_tasks(
+        partial(fit_batch, lags=args.lag),
+        list(batches.values()),
+        workers,
+        label=lambda batch: f"{len(batch)} measures with {batch[0][3].shape[0]} groups",
+    )
+    coefficients = pd.concat([result for _, result in results], ignore_index=True)
+    # batches finish in any order; keep each measure's terms in model order
+    coefficients = coefficients.sort_values("measure_id", kind="stable")
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    path = args.output_dir / "coefficients.csv"
+    coefficients[FIELDS].to_csv(path, index=False)
+    print(f"{path}: {coefficients['measure_id'].nunique()} measures, {len(coefficients)} terms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Join the index-date-independent attributes onto each monthly cohort.
+
+`study_definition_static.py` extracts the attributes that do not depend on the index
+date once. This script derives the household categories from them, then joins them
+onto every `input_*` cohort in the cohort directory. Only patients in both the monthly
+and the static population are kept, which applies the sex, household size and
+01/02/2020 registration criteria.
+
+Usage:
+
+    python analysis/join_static.py <cohort-dir> <output-dir>
+        [--study-definition analysis/study_definition.py]
+        [--output-format feather|csv] [--rename big=big_household]
+        [--static-cohort output/static/input_static.feather]
+        [--fingerprints output/cohorts/cohort_fingerprints.json]
+        [--workers N] [--memory-budget MB]
+
+With `--fingerprints`, every month must be recorded in that manifest as extracted by the
+current study definition, or nothing is joined (see cohort_fingerprints.py).
+
+Months are joined in a pool of worker processes, each holding its own copy of the static
+attributes (see parallel.py). Each output is written with a schema sidecar describing
+its columns (see cohort_io.py). The time taken for each month and the number of patients
+with a value for each extracted variable are written to `join_profile.json` and
+`join_profile.csv` in the output directory (see profiling.py).
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from cohort_fingerprints import check_months
+from cohort_io import CATEGORY, cohort_files, read_cohort, study_schema, write_cohort
+from measures import INPUT_PATTERN
+from parallel import add_arguments, estimate_task_memory_mb, map_tasks, worker_count
+from profiling import Profile
+
+STATIC_DEFINITION = Path("analysis/study_definition_static.py")
+STATIC_COHORT = Path("output/static/input_static.feather")
+DERIVED_SCHEMA = {"living_alone": CATEGORY, "big": CATEGORY, "all_tpp": CATEGORY}
+
+
+def derive_household_categories(static):
+    """Add living_alone, big and all_tpp, as previously defined in the study definition."""
+    size = static["household_size"]
+    static["living_alone"] = np.select(
+        [size == 1, size > 1], ["living alone", "not living alone"], "missing"
+    )
+    static["big"] = np.select(
+        [size <= 10, size > 10], ["normal household", "big household"], "missing"
+    )
+    percent_tpp = static["percent_tpp"]
+    static["all_tpp"] = np.select(
+        [percent_tpp < 100, percent_tpp == 100], ["not all TPP", "all TPP"], "missing"
+    )
+    return static
+
+
+def load_static(schema, path=STATIC_COHORT):
+    return derive_household_categories(read_cohort(path, schema=schema))
+
+
+def join_cohort(cohort, static, renames=None):
+    joined = cohort.merge(static, on="patient_id", how="inner", validate="one_to_one")
+    if renames:
+        joined = joined.rename(columns=renames)
+    return joined
+
+
+_worker = {}
+
+
+def start_worker(schema, static_path, renames, output_dir, output_format):
+    profile = Profile()
+    with profile.step("load_static"):
+        static = load_static(schema, static_path)
+    _worker.update(
+        schema=schema,
+        static=static,
+        renames=renames,
+        output_dir=output_dir,
+        output_format=output_format,
+        records=profile.records,
+    )
+
+
+def join_month(path):
+    """Join the static attributes onto one monthly cohort and write it."""
+    schema = _worker["schema"]
+    profile = Profile()
+    # each worker reports its load_static timing with its first month
+    profile.extend(_worker.pop("records", []))
+    match = INPUT_PATTERN.fullmatch(path.stem)
+    index_date = match.group(1) if match else path.stem
+    with profile.step("read_cohort", index_date):
+        cohort = read_cohort(path, schema=schema)
+    profile.count_variables(cohort, schema, index_date)
+    with profile.step("join_cohort", index_date, len(cohort)) as counts:
+        joined = join_cohort(cohort, _worker["static"], _worker["renames"])
+        counts["rows_out"] = len(joined)
+    output = _worker["output_dir"] / f"{path.stem}.{_worker['output_format']}"
+    with profile.step("write_cohort", index_date):
+        write_cohort(joined, output, schema)
+    return f"{output.name}: kept {len(joined)} of {len(cohort)} patients", profile.records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("cohort_dir", type=Path)
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument(
+        "--study-definition", type=Path, default=Path("analysis/study_definition.py")
+    )
+    parser.add_argument("--output-format", choices=["feather", "csv"], default="feather")
+    parser.add_argument("--static-cohort", type=Path, default=STATIC_COHORT)
+    parser.add_argument(
+        "--fingerprints", type=Path, help="refuse months that are stale in this manifest"
+    )
+    parser.add_argument(
+        "--rename",
+        action="append",
+        default=[],
+        metavar="OLD=NEW",
+        help="rename a joined column, e.g. big=big_household",
+    )
+    add_arguments(parser)
+    args = parser.parse_args()
+    renames = dict(rename.split("=", 1) for rename in args.rename)
+    schema = {**study_schema(args.study_definition, STATIC_DEFINITION), **DERIVED_SCHEMA}
+    schema.update({new: schema[old] for old, new in renames.items() if old in schema})
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    paths = cohort_files(args.cohort_dir)
+    if args.fingerprints:
+        dates = [INPUT_PATTERN.fullmatch(path.stem).group(1) for path in paths]
+        check_months(dates, args.fingerprints)
+    workers = worker_count(
+        args.workers,
+        args.memory_budget,
+        estimate_task_memory_mb(paths) + estimate_task_memory_mb([args.static_cohort]),
+        tasks=len(paths),
+    )
+    profile = Profile()
+    for _, (message, records) in map_tasks(
+        join_month,
+        paths,
+        workers,
+        initializer=start_worker,
+        initargs=(schema, args.static_cohort, renames, args.output_dir, args.output_format),
+        label=lambda path: path.name,
+    ):
+        print(message)
+        profile.extend(records)
+
+    profile.write(args.output_dir / "join_profile")
+    print(profile.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Keep every measure as NumPy arrays that are memory-mapped rather than parsed.
+
+The Stata scripts and the Python actions all read the same measures, each parsing them
+again. This converts the measures once, from the measures store (or the
+`measure_<id>.csv` files), into a directory of `.npy` files, one per measure and column,
+with an `index.json` keying each measure by its outcome and stratum, e.g.
+("anxiety", "region") for `anxiety_region` and ("anxiety", None) for `anxiety_rate`.
+
+`MeasureRegistry.get` memory-maps a measure's arrays read-only with `np.load`, so they
+are views of the files: nothing is parsed or copied, and pages are only read when used.
+The columns are `numerator`, `denominator`, `value` and `date` (datetime64[D]), and the
+group-by columns as integer codes into their categories (the values as in the CSV). Rows
+are in the order of the measures store: by date, then group. `MeasureArrays.frame` gives
+the CSV's columns as a DataFrame, for code that works with DataFrames.
+
+Usage:
+
+    python analysis/measure_registry.py [--store output/measures/measures.parquet]
+                                        [--measures-dir output/measures]
+                                        [--study-definition analysis/study_definition.py]
+                                        [--output-dir output/measures/registry]
+
+    from measure_registry import MeasureRegistry
+    registry = MeasureRegistry("output/measures/registry")
+    arrays = registry.get("self_harm", "region")
+    arrays.value, arrays.date, arrays.codes["region"], arrays.categories["region"]
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cohort_io import atomic_path
+from disclosure import read_measures
+
+GROUP = "living_alone"
+INDEX = "index.json"
+
+
+def registry_key(measure_id, group_by):
+    """Return (outcome, stratum) for a measure, e.g. ("anxiety", "region")."""
+    strata = [column for column in group_by if column != GROUP]
+    stratum = "_".join(strata) or None
+    suffix = f"_{stratum}" if stratum else "_rate"
+    outcome = measure_id[: -len(suffix)] if measure_id.endswith(suffix) else measure_id
+    return outcome, stratum
+
+
+def _save(path, array):
+    with atomic_path(path) as temporary:
+        with temporary.open("wb") as f:
+            np.save(f, array)
+
+
+def build_registry(measures, definitions, directory):
+    """Write a long-format measures table to `directory` as one array per column."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    index = {}
+    for measure_id, frame in measures.groupby("measure_id", sort=False):
+        definition = definitions[measure_id]
+        group_by = definition["group_by"]
+        measure_dir = directory / measure_id
+        measure_dir.mkdir(exist_ok=True)
+        arrays = {
+            "numerator": frame["numerator"].to_numpy(dtype=np.int64),
+            "denominator": frame["denominator"].to_numpy(dtype=np.int64),
+            "value": frame["value"].to_numpy(dtype=np.float64),
+            "date": pd.to_datetime(frame["date"]).to_numpy().astype("datetime64[D]"),
+        }
+        categories = {}
+        for column in group_by:
+            codes, uniques = pd.factorize(frame[column].astype(str), sort=True)
+            arrays[column] = codes.astype(np.int16)
+            categories[column] = list(uniques)
+        for name, array in arrays.items():
+            _save(measure_dir / f"{name}.npy", array)
+        outcome, stratum = registry_key(measure_id, group_by)
+        index[measure_id] = {
+            "outcome": outcome,
+            "stratum": stratum,
+            "numerator": definition["numerator"],
+            "denominator": definition["denominator"],
+            "group_by": group_by,
+            "categories": categories,
+            "rows": len(frame),
+        }
+    # the index is written last, so a registry is only read once all its arrays are
+    with atomic_path(directory / INDEX) as temporary:
+        temporary.write_text(json.dumps(index, indent=2) + "\n")
+    return index
+
+
+class MeasureArrays:
+    """One measure's columns, as read-only memory-mapped arrays."""
+
+    def __init__(self, directory, measure_id, definition):
+        self.measure_id = measure_id
+        self.definition = definition
+        self.group_by = definition["group_by"]
+        self.categories = definition["categories"]
+        self.path = Path(directory) / measure_id
+        self.numerator = self._load("numerator")
+        self.denominator = self._load("denominator")
+        self.value = self._load("value")
+        self.date = self._load("date")
+        self.codes = {column: self._load(column) for column in self.group_by}
+
+    def _load(self, name):
+        return np.load(self.path / f"{name}.npy", mmap_mode="r")
+
+    def __len__(self):
+        return len(self.value)
+
+    def frame(self):
+        """Return the measure as a DataFrame with the columns of `measure_<id>.csv`."""
+        columns = {
+            column: pd.Categorical.from_codes(
+                self.codes[column], self.categories[column]
+            ).astype(str)
+            for column in self.group_by
+        }
+        columns[self.definition["numerator"]] = self.numerator
+        columns[self.definition["denominator"]] = self.denominator
+        columns["value"] = self.value
+        columns["date"] = np.datetime_as_string(self.date, unit="D")
+        return pd.DataFrame(columns)
+
+
+class MeasureRegistry:
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.index = json.loads((self.directory / INDEX).read_text())
+        self.keys = {
+            (definition["outcome"], definition["stratum"]): measure_id
+            for measure_id, definition in self.index.items()
+        }
+
+    @property
+    def measure_ids(self):
+        return list(self.index)
+
+    def get(self, outcome, stratum=None):
+        """Return the arrays of the measure for `outcome`, by `stratum` (or by living alone)."""
+        return self.read(self.keys[outcome, stratum])
+
+    def read(self, measure_id):
+        """Return the arrays of a measure, by measure id."""
+        return MeasureArrays(self.directory, measure_id, self.index[measure_id])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", type=Path, default=Path("output/measures/measures.parquet"))
+    parser.add_argument("--measures-dir", type=Path, default=Path("output/measures"))
+    parser.add_argument(
+        "--study-definition", type=Path, default=Path("analysis/study_definition.py")
+    )
+    parser.add_argument("--output-dir", type=Path, default=Path("output/measures/registry"))
+    args = parser.parse_args()
+
+    measures, definitions = read_measures(args.store, args.measures_dir, args.study_definition)
+    index = build_registry(measures, definitions, args.output_dir)
+    print(f"{args.output_dir}: {len(index)} measures, {len(measures)} rows")
+
+
+if __name__ == "__main__":
+    main()
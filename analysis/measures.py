@@ -0,0 +1,246 @@
+"""Calculate every measure in the study definition in one pass per month.
+
+This replaces cohortextractor's `generate_measures`, which regroups the whole monthly
+cohort once per `Measure`. Here each month is read once, every group-by column is
+encoded to integer codes, and the numerators and denominators are summed over the
+cells of all the group-by columns together in one pass over the rows. The cells are
+then summed up to each distinct set of group-by columns once, and each measure takes its
+numerator and denominator from those sums. There can be nearly as many cells as rows in a
+small cohort, so the measures sharing group-by columns share that aggregation.
+
+The outputs match `generate_measures`: one `measure_<id>.csv` per measure with the
+group-by columns, the numerator, the denominator, `value` and `date`. As with
+`generate_measures`, rows with a missing group-by value are dropped.
+
+Months are calculated in a pool of worker processes (see parallel.py). The time taken to
+read, tabulate and aggregate each month is written to
+`measures_profile.json` and `measures_profile.csv` in the output directory. With
+`--fingerprints`, months not recorded as extracted by the current study definition are
+refused (see cohort_fingerprints.py).
+
+Usage:
+
+    python analysis/measures.py [--study-definition analysis/study_definition.py]
+                                [--output-dir output/measures]
+                                [--store output/measures/measures.parquet]
+                                [--fingerprints output/cohorts/cohort_fingerprints.json]
+                                [--workers N] [--memory-budget MB]
+"""
+
+import argparse
+import re
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cohort_fingerprints import check_months
+from cohort_io import cohort_files, read_cohort
+from measures_store import write_store
+from parallel import add_arguments, estimate_task_memory_mb, map_tasks, worker_count
+from profiling import Profile
+from study_parser import load_measures
+
+POPULATION = "population"
+INPUT_PATTERN = re.compile(r"input_(\d{4}-\d{2}-\d{2})")
+
+
+def _summed_columns(measures):
+    columns = []
+    for measure in measures:
+        for column in (measure.numerator, measure.denominator):
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+def _group_columns(measures):
+    columns = []
+    for measure in measures:
+        for column in measure.group_by:
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+def tabulate_cells(cohort, group_columns, summed_columns):
+    """Sum `summed_columns` over every combination of `group_columns` in one pass.
+
+    Returns the cells as a DataFrame of integer codes, one column per group-by column,
+    the category values each code stands for, and an array of the sums with one row
+    per cell and one column per summed column. Missing values are given the code one
+    past the last category, so that each measure can drop them for its own group-by
+    columns only.
+    """
+    codes = []
+    categories = {}
+    for column in group_columns:
+        column_codes, uniques = pd.factorize(cohort[column], sort=True)
+        column_codes[column_codes < 0] = len(uniques)
+        codes.append(column_codes)
+        categories[column] = uniques
+    shape = _shape(categories, group_columns)
+
+    key = np.ravel_multi_index(codes, shape) if codes else np.zeros(len(cohort), dtype=int)
+    cells, inverse = np.unique(key, return_inverse=True)
+    inverse = inverse.ravel()
+    sums = np.empty((len(cells), len(summed_columns)), dtype=np.int64)
+    for i, column in enumerate(summed_columns):
+        if column == POPULATION:
+            sums[:, i] = np.bincount(inverse, minlength=len(cells))
+        else:
+            weights = cohort[column].to_numpy()
+            sums[:, i] = np.bincount(inverse, weights=weights, minlength=len(cells))
+    cell_codes = pd.DataFrame(
+        np.column_stack(np.unravel_index(cells, shape)) if codes else None,
+        columns=group_columns,
+    )
+    return cell_codes, categories, sums
+
+
+def _shape(categories, columns):
+    # one extra code per column for missing values
+    return tuple(len(categories[column]) + 1 for column in columns)
+
+
+def aggregate_cells(group_by, cell_codes, categories, sums):
+    """Sum the cells up to `group_by`, for every summed column at once.
+
+    Returns the groups as a DataFrame of their values and the sums with one row per
+    group. Each column is summed with one `np.bincount` over the cells' ravelled codes
+    for `group_by`, and groups with a missing value are dropped.
+    """
+    if not group_by:
+        return pd.DataFrame(index=range(1)), sums.sum(axis=0, keepdims=True)
+    shape = _shape(categories, group_by)
+    key = np.ravel_multi_index([cell_codes[column].to_numpy() for column in group_by], shape)
+    size = int(np.prod(shape))
+    group_codes = np.unravel_index(np.arange(size), shape)
+    keep = np.bincount(key, minlength=size) > 0
+    for column, column_codes in zip(group_by, group_codes):
+        keep &= column_codes < len(categories[column])
+    totals = np.column_stack(
+        [np.bincount(key, weights=column, minlength=size)[keep] for column in sums.T]
+    ).astype(np.int64)
+    groups = pd.DataFrame(
+        {
+            column: categories[column].take(column_codes[keep])
+            for column, column_codes in zip(group_by, group_codes)
+        }
+    )
+    return groups, totals
+
+
+def measure_result(measure, groups, totals, summed_columns):
+    """Return one measure's rows from the sums of its group-by columns."""
+    numerator = totals[:, summed_columns.index(measure.numerator)]
+    denominator = totals[:, summed_columns.index(measure.denominator)]
+    result = groups.copy()
+    result[measure.numerator] = numerator
+    result[measure.denominator] = denominator
+    result["value"] = numerator / denominator
+    return result
+
+
+def calculate_month(path, measures, profile=None, index_date=None):
+    profile = profile or Profile()
+    group_columns = _group_columns(measures)
+    summed_columns = _summed_columns(measures)
+    read_columns = group_columns + [c for c in summed_columns if c != POPULATION]
+    with profile.step("read_cohort", index_date):
+        cohort = read_cohort(path, columns=read_columns)
+    with profile.step("tabulate_cells", index_date, len(cohort)) as counts:
+        cell_codes, categories, sums = tabulate_cells(cohort, group_columns, summed_columns)
+        counts["rows_out"] = len(cell_codes)
+    with profile.step("aggregate_measures", index_date, len(cell_codes)):
+        # measures with the same group-by columns share one aggregation
+        aggregated = {}
+        results = {}
+        for measure in measures:
+            group_by = tuple(measure.group_by)
+            if group_by not in aggregated:
+                aggregated[group_by] = aggregate_cells(
+                    measure.group_by, cell_codes, categories, sums
+                )
+            results[measure.id] = measure_result(measure, *aggregated[group_by], summed_columns)
+        return results
+
+
+def profile_month(date_path, measures):
+    """Calculate one month in a worker, returning its results and profile records."""
+    date, path = date_path
+    profile = Profile()
+    return calculate_month(path, measures, profile, date), profile.records
+
+
+def input_files(output_dir):
+    """Return (date, path) for each monthly cohort, in date order."""
+    files = []
+    for path in cohort_files(output_dir):
+        match = INPUT_PATTERN.fullmatch(path.stem)
+        if match:
+            files.append((match.group(1), path))
+    return sorted(files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--study-definition", type=Path, default=Path("analysis/study_definition.py")
+    )
+    parser.add_argument("--output-dir", type=Path, default=Path("output/measures"))
+    parser.add_argument(
+        "--store", type=Path, help="also write every measure to one file (see measures_store.py)"
+    )
+    parser.add_argument(
+        "--fingerprints", type=Path, help="refuse months that are stale in this manifest"
+    )
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    measures = load_measures(args.study_definition)
+    files = input_files(args.output_dir)
+    if args.fingerprints:
+        check_months([date for date, _ in files], args.fingerprints)
+    workers = worker_count(
+        args.workers,
+        args.memory_budget,
+        estimate_task_memory_mb([path for _, path in files]),
+        tasks=len(files),
+    )
+    monthly_results = {}
+    profile = Profile()
+    for (date, path), (month, records) in map_tasks(
+        partial(profile_month, measures=measures),
+        files,
+        workers,
+        label=lambda date_path: f"{date_path[1].name}: calculated {len(measures)} measures",
+    ):
+        monthly_results[date] = month
+        profile.extend(records)
+
+    # months finish in any order, but the measure files are in date order
+    results = {measure.id: [] for measure in measures}
+    for date in sorted(monthly_results):
+        for measure_id, result in monthly_results[date].items():
+            result["date"] = date
+            results[measure_id].append(result)
+
+    results = {
+        measure_id: pd.concat(monthly, ignore_index=True)
+        for measure_id, monthly in results.items()
+    }
+    with profile.step("write_measures"):
+        for measure_id, result in results.items():
+            result.to_csv(args.output_dir / f"measure_{measure_id}.csv", index=False)
+    if args.store:
+        with profile.step("write_store"):
+            write_store(args.store, measures, results)
+
+    profile.write(args.output_dir / "measures_profile")
+    print(profile.summary())
+
+
+if __name__ == "__main__":
+    main()
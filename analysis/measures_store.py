@@ -0,0 +1,123 @@
+"""A single long-format file holding every measure.
+
+`measures.py` writes one `measure_<id>.csv` per measure for the Stata scripts. With
+`--store` it also writes all the measures to one Parquet file with a row per measure,
+date and group: `measure_id`, `date`, one column per group-by variable (empty for
+measures that do not group by it), `numerator`, `denominator` and `value`. Rows are
+sorted by `measure_id` and `date`, and each measure is its own row group, so reading one
+measure, or a range of dates of it, only reads that row group rather than the file.
+Each measure's numerator, denominator and group-by columns are kept in the file's
+metadata, so `read_measure` returns the same columns as `measure_<id>.csv`.
+
+Usage:
+
+    from measures_store import MeasureStore, read_measure
+    rates = read_measure("output/measures/measures.parquet", "self_harm_rate")
+    store = MeasureStore("output/measures/measures.parquet")
+    by_region = store.read("self_harm_region", start="2020-03-01", end="2021-03-01")
+"""
+
+import json
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+METADATA_KEY = b"measures"
+
+
+def long_format(measure, monthly):
+    """Reshape one measure's results to the store's columns."""
+    frame = monthly.rename(
+        columns={measure.numerator: "numerator", measure.denominator: "denominator"}
+    )
+    frame.insert(0, "measure_id", measure.id)
+    frame["date"] = pd.to_datetime(frame["date"])
+    columns = ["measure_id", "date", *measure.group_by, "numerator", "denominator", "value"]
+    return frame[columns].sort_values(["date", *measure.group_by], kind="stable")
+
+
+def write_store(path, measures, results):
+    """Write `results` ({measure id: DataFrame as in measure_<id>.csv}) to one file."""
+    group_columns = []
+    for measure in measures:
+        group_columns += [column for column in measure.group_by if column not in group_columns]
+    schema = pa.schema(
+        [
+            ("measure_id", pa.string()),
+            ("date", pa.date32()),
+            *[(column, pa.string()) for column in group_columns],
+            ("numerator", pa.int64()),
+            ("denominator", pa.int64()),
+            ("value", pa.float64()),
+        ]
+    )
+    metadata = {
+        measure.id: {
+            "numerator": measure.numerator,
+            "denominator": measure.denominator,
+            "group_by": measure.group_by,
+        }
+        for measure in measures
+    }
+    schema = schema.with_metadata({METADATA_KEY: json.dumps(metadata)})
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for measure in sorted(measures, key=lambda measure: measure.id):
+            frame = long_format(measure, results[measure.id])
+            for column in group_columns:
+                frame[column] = (
+                    frame[column].astype(str) if column in measure.group_by else None
+                )
+            frame["date"] = frame["date"].dt.date
+            table = pa.Table.from_pandas(frame[schema.names], schema=schema, preserve_index=False)
+            writer.write_table(table, row_group_size=len(frame) or 1)
+
+
+class MeasureStore:
+    """An open measures store, for reading many measures from one file."""
+
+    def __init__(self, path):
+        self.file = pq.ParquetFile(path)
+        self.definitions = json.loads(self.file.schema_arrow.metadata[METADATA_KEY])
+        # each row group holds one measure; find which from the measure_id statistics
+        self.row_groups = {}
+        for i in range(self.file.num_row_groups):
+            statistics = self.file.metadata.row_group(i).column(0).statistics
+            self.row_groups[statistics.min] = i
+
+    @property
+    def measure_ids(self):
+        return list(self.definitions)
+
+    def read(self, measure_id, start=None, end=None):
+        """Read one measure, optionally from `start` to `end` (ISO dates), as in its CSV."""
+        definition = self.definitions[measure_id]
+        columns = [*definition["group_by"], "numerator", "denominator", "value", "date"]
+        if measure_id in self.row_groups:
+            table = self.file.read_row_group(self.row_groups[measure_id], columns=columns)
+            frame = table.to_pandas()
+        else:
+            frame = pd.DataFrame(columns=columns)
+        dates = pd.to_datetime(frame["date"])
+        keep = pd.Series(True, index=frame.index)
+        if start:
+            keep &= dates >= pd.Timestamp(start)
+        if end:
+            keep &= dates <= pd.Timestamp(end)
+        frame = frame[keep].reset_index(drop=True)
+        frame["date"] = dates[keep].dt.strftime("%Y-%m-%d").to_numpy()
+        return frame.rename(
+            columns={
+                "numerator": definition["numerator"],
+                "denominator": definition["denominator"],
+            }
+        )
+
+    def read_all(self):
+        """Read every measure as one long-format DataFrame, in the store's columns."""
+        return self.file.read().to_pandas()
+
+
+def read_measure(path, measure_id, start=None, end=None):
+    """Read one measure from the store at `path`; see MeasureStore.read."""
+    return MeasureStore(path).read(measure_id, start, end)
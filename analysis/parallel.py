@@ -0,0 +1,71 @@
+"""Run the independent steps of the Python actions, such as months, in a process pool.
+
+The monthly cohorts are independent, so `join_static.py`, `measures.py`, `report.py` and
+`dummy_data.py` process them in a pool of worker processes. The pool has one worker per
+CPU by default, capped so that the estimated memory of the workers stays within
+`--memory-budget` (in MB), e.g. the memory limit of the job. A worker's memory is
+estimated from the largest input file, scaled by how much bigger than the file a cohort
+is once loaded, plus any fixed amount each worker holds (such as the static attributes
+in `join_static.py`).
+
+`its.py` and `charts.py` use the same pool for batches of measures and for charts.
+`map_tasks` prints a progress line as each task finishes.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+# in-memory size of a loaded cohort relative to its size on disk, allowing for the
+# working copies made while joining or tabulating it
+MEMORY_PER_FILE_BYTE = {".feather": 12, ".csv": 3}
+
+
+def estimate_task_memory_mb(paths):
+    """Estimate the memory needed to process the largest of `paths`, in MB."""
+    sizes = [
+        Path(path).stat().st_size * MEMORY_PER_FILE_BYTE.get(Path(path).suffix, 3)
+        for path in paths
+    ]
+    return max(sizes, default=0) / 2**20
+
+
+def worker_count(workers=None, memory_budget_mb=None, task_memory_mb=0, tasks=None):
+    """Return how many workers to run: one per CPU, within the memory budget."""
+    workers = workers or os.cpu_count() or 1
+    if memory_budget_mb and task_memory_mb:
+        workers = min(workers, int(memory_budget_mb // task_memory_mb))
+    if tasks is not None:
+        workers = min(workers, tasks)
+    return max(workers, 1)
+
+
+def add_arguments(parser):
+    parser.add_argument("--workers", type=int, help="default: one per CPU")
+    parser.add_argument("--memory-budget", type=float, metavar="MB")
+
+
+def map_tasks(function, items, workers, initializer=None, initargs=(), label=str):
+    """Yield `(item, function(item))` for each item as it finishes, printing progress.
+
+    With one worker the items are processed in order in this process.
+    """
+    total = len(items)
+    start = time.perf_counter()
+    if workers <= 1:
+        if initializer:
+            initializer(*initargs)
+        results = ((item, function(item)) for item in items)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs)
+        futures = {executor.submit(function, item): item for item in items}
+        results = ((futures[future], future.result()) for future in as_completed(futures))
+    try:
+        for done, (item, result) in enumerate(results, 1):
+            print(f"[{done}/{total}] {label(item)} ({time.perf_counter() - start:.1f}s)")
+            yield item, result
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
@@ -0,0 +1,101 @@
+"""Record timings and row counts for the Python actions, and write them as a profile.
+
+A `Profile` collects one record per timed step (e.g. reading or joining one month) and
+per variable per index date, with the elapsed time, the rows going into the step and
+the rows coming out of it. `write` saves the records as `<name>.json` and `<name>.csv`
+next to the action's outputs, and `summary` gives the slowest steps and the share of
+patients with a value for each variable, for printing at the end of a run.
+
+For a variable, the rows in are the patients in the extracted cohort and the rows out
+are those with a non-zero, non-missing value. That is how common the variable's values
+are, not what it cost to extract: cohortextractor reports neither per-variable timings
+nor the rows its queries scan. A share far from what the study expects (such as a flag
+set for most patients) points to a definition worth checking.
+"""
+
+import csv
+import json
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from cohort_io import CATEGORY, DATE
+
+FIELDS = ["kind", "name", "index_date", "elapsed_seconds", "rows_in", "rows_out"]
+
+
+class Profile:
+    def __init__(self):
+        self.records = []
+
+    def record(self, kind, name, index_date=None, elapsed_seconds=None, rows_in=None,
+               rows_out=None):
+        self.records.append(
+            {
+                "kind": kind,
+                "name": name,
+                "index_date": index_date,
+                "elapsed_seconds": None if elapsed_seconds is None else round(elapsed_seconds, 4),
+                "rows_in": rows_in,
+                "rows_out": rows_out,
+            }
+        )
+
+    def extend(self, records):
+        """Add records from another Profile, e.g. one kept by a worker process."""
+        self.records.extend(records)
+
+    @contextmanager
+    def step(self, name, index_date=None, rows_in=None):
+        """Time the body of a `with` block; set `counts["rows_out"]` inside it."""
+        counts = {"rows_in": rows_in, "rows_out": None}
+        start = time.perf_counter()
+        yield counts
+        self.record("step", name, index_date, time.perf_counter() - start, **counts)
+
+    def count_variables(self, cohort, schema, index_date):
+        """Record how many patients in a cohort have a value for each variable."""
+        for column in cohort.columns:
+            if column == "patient_id":
+                continue
+            values = cohort[column]
+            if schema.get(column) in (CATEGORY, DATE):
+                has_value = values.notna()
+            else:
+                has_value = values.notna() & (values != 0)
+            self.record("variable", column, index_date, None, len(cohort), int(has_value.sum()))
+
+    def write(self, path):
+        """Write the records to `<path>.json` and `<path>.csv`."""
+        path = Path(path)
+        path.with_suffix(".json").write_text(json.dumps(self.records, indent=2) + "\n")
+        with path.with_suffix(".csv").open("w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(self.records)
+
+    def summary(self, top=10):
+        """Return the slowest steps and the variables most often with a value."""
+        records = pd.DataFrame(self.records, columns=FIELDS)
+        lines = []
+        steps = records[records["kind"] == "step"]
+        if len(steps):
+            totals = steps.groupby("name")["elapsed_seconds"].agg(["sum", "count", "max"])
+            lines.append(f"Slowest steps (of {len(totals)}):")
+            for name, row in totals.sort_values("sum", ascending=False).head(top).iterrows():
+                lines.append(
+                    f"  {name:<32} {row['sum']:9.2f}s total over {int(row['count'])}, "
+                    f"max {row['max']:.2f}s"
+                )
+        variables = records[records["kind"] == "variable"]
+        if len(variables):
+            totals = variables.groupby("name")[["rows_out", "rows_in"]].sum()
+            totals["share"] = totals["rows_out"] / totals["rows_in"]
+            lines.append(f"Variables with a value for the most patients (of {len(totals)}):")
+            for name, row in totals.sort_values("share", ascending=False).head(top).iterrows():
+                lines.append(
+                    f"  {name:<32} {row['share']:7.1%} of {int(row['rows_in']):,} patient-months"
+                )
+        return "\n".join(lines)
@@ -1,6 +1,206 @@
+"""Descriptive summary of every monthly cohort.
+
+Each monthly cohort is read in chunks of a bounded number of rows, and each chunk is
+reduced to histograms (age, household_size and percent_tpp, in bands) and category
+counts for every categorical variable. The summaries can be added together, so months
+are summarised in parallel in a process pool and then combined, and memory use depends
+on the chunk size rather than on the size of the cohorts.
+
+The tables are released, so counts from 1 to `--threshold` - 1 (7 by default) are
+suppressed, as are complementary counts: within each variable and date, and for each
+band or category across the dates and their total, no count is left as the only one
+suppressed (see disclosure.py). The other counts are rounded to the nearest 5.
+
+Outputs, with suppressed counts left blank:
+
+- output/descriptives/histograms.csv: variable, date, value, count
+- output/descriptives/category_counts.csv: variable, date, category, count
+- output/descriptive.png: the age distribution over all months (person-months)
+
+Usage:
+
+    python analysis/report.py [--cohort-dir output/measures] [--chunk-rows 100000]
+                              [--threshold 8] [--workers N] [--memory-budget MB]
+"""
+
+import argparse
+from collections import Counter, defaultdict
+from functools import partial
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 
-data = pd.read_csv("output/input.csv")
+from cohort_io import CATEGORY, cohort_files, iter_cohort, read_schema
+from disclosure import nearest, suppress_complementary
+from parallel import add_arguments, map_tasks, worker_count
+
+# integer variables summarised as histograms, by the lower bound of each band; the last
+# band is open-ended
+HISTOGRAMS = {
+    "age": [0, 18, 25, 35, 45, 55, 65, 75, 85],
+    "household_size": [0, 1, 2, 3, 4, 6, 11],
+    "percent_tpp": [0, 25, 50, 75, 100],
+}
+THRESHOLD = 8
+OUTPUT_DIR = Path("output/descriptives")
+FIGURE = Path("output/descriptive.png")
+ALL_DATES = "all"
+# bytes per row of a chunk while it is being summarised, allowing for the working copies
+MEMORY_PER_CHUNK_ROW = 1024
+
+
+class Summary:
+    """Histograms and category counts that can be added together."""
+
+    def __init__(self):
+        # one count per band, then the missing values
+        self.histograms = {
+            name: np.zeros(len(bands) + 1, dtype=np.int64) for name, bands in HISTOGRAMS.items()
+        }
+        self.categories = defaultdict(Counter)
+
+    def update(self, chunk, categorical_columns):
+        for name, bands in HISTOGRAMS.items():
+            if name not in chunk:
+                continue
+            values = chunk[name]
+            missing = int(values.isna().sum())
+            bins = np.searchsorted(bands, values.dropna().to_numpy(), side="right") - 1
+            bins = np.clip(bins, 0, None)
+            self.histograms[name][: len(bands)] += np.bincount(bins, minlength=len(bands))
+            self.histograms[name][len(bands)] += missing
+        for column in categorical_columns:
+            counts = chunk[column].value_counts(dropna=False)
+            self.categories[column].update(
+                {("missing" if pd.isna(key) else str(key)): int(n) for key, n in counts.items()}
+            )
+
+    def __iadd__(self, other):
+        for name in self.histograms:
+            self.histograms[name] += other.histograms[name]
+        for column, counts in other.categories.items():
+            self.categories[column].update(counts)
+        return self
+
+
+def summarise_month(path, chunk_rows):
+    schema = read_schema(path)
+    categorical_columns = [column for column, type_ in schema.items() if type_ == CATEGORY]
+    columns = [column for column in HISTOGRAMS if column in schema] + categorical_columns
+    summary = Summary()
+    for chunk in iter_cohort(path, columns, chunk_rows):
+        summary.update(chunk, categorical_columns)
+    return summary
+
+
+def band_labels(bands):
+    """Return labels such as "18-24" for bands given by their lower bounds, and "missing"."""
+    labels = [
+        str(lower) if upper - lower == 1 else f"{lower}-{upper - 1}"
+        for lower, upper in zip(bands, bands[1:])
+    ]
+    return labels + [f"{bands[-1]}+", "missing"]
+
+
+def redact(table, key, threshold):
+    """Suppress small and complementary counts, and round the rest to the nearest 5.
+
+    The counts of a variable on one date add up to the cohort, and each band's or
+    category's counts on every date add up to its total over all dates, so both are
+    protected as sets of cells.
+    """
+    counts = table["count"].to_numpy(dtype=np.int64)
+    suppressed = (counts > 0) & (counts < threshold)
+    cell_sets = [
+        table.groupby(["variable", "date"], sort=False).ngroup().to_numpy(),
+        table.groupby(["variable", key], sort=False).ngroup().to_numpy(),
+    ]
+    suppress_complementary(suppressed, counts, cell_sets)
+    table["count"] = pd.array(nearest(counts, 5), dtype="Int64")
+    table.loc[suppressed, "count"] = pd.NA
+    return table
+
+
+def summary_tables(summaries, threshold=THRESHOLD):
+    histograms = []
+    categories = []
+    for date, summary in summaries.items():
+        for name, counts in summary.histograms.items():
+            histograms.append(
+                pd.DataFrame(
+                    {
+                        "variable": name,
+                        "date": date,
+                        "value": band_labels(HISTOGRAMS[name]),
+                        "count": counts,
+                    }
+                )
+            )
+        for column, counts in sorted(summary.categories.items()):
+            categories.append(
+                pd.DataFrame(
+                    {
+                        "variable": column,
+                        "date": date,
+                        "category": list(counts),
+                        "count": list(counts.values()),
+                    }
+                )
+            )
+    histograms = pd.concat(histograms, ignore_index=True)
+    categories = pd.concat(categories, ignore_index=True)
+    return redact(histograms, "value", threshold), redact(categories, "category", threshold)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cohort-dir", type=Path, default=Path("output/measures"))
+    parser.add_argument("--chunk-rows", type=int, default=100_000)
+    parser.add_argument("--threshold", type=int, default=THRESHOLD)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    paths = cohort_files(args.cohort_dir)
+    # months are read in chunks, so a worker's memory depends on the chunk size
+    workers = worker_count(
+        args.workers,
+        args.memory_budget,
+        args.chunk_rows * MEMORY_PER_CHUNK_ROW / 2**20,
+        tasks=len(paths),
+    )
+    summaries = {}
+    for path, summary in map_tasks(
+        partial(summarise_month, chunk_rows=args.chunk_rows),
+        paths,
+        workers,
+        label=lambda path: f"{path.name}: summarised",
+    ):
+        summaries[path.stem.replace("input_", "")] = summary
+    summaries = dict(sorted(summaries.items()))
+
+    overall = Summary()
+    for summary in summaries.values():
+        overall += summary
+    summaries[ALL_DATES] = overall
+
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    histograms, categories = summary_tables(summaries, args.threshold)
+    histograms.to_csv(OUTPUT_DIR / "histograms.csv", index=False)
+    categories.to_csv(OUTPUT_DIR / "category_counts.csv", index=False)
+
+    age = histograms[(histograms["variable"] == "age") & (histograms["date"] == ALL_DATES)]
+    age = age[age["value"] != "missing"]
+    fig, ax = plt.subplots()
+    ax.bar(age["value"], age["count"].fillna(0).to_numpy(dtype=float))
+    ax.set_xlabel("Age")
+    ax.set_ylabel("Person-months")
+    fig.savefig(FIGURE)
+
 
-fig = data.age.plot.hist().get_figure()
-fig.savefig("output/descriptive.png")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -38,6 +38,7 @@ study = StudyDefinition(
 
     # INCLUDE: age 18+ on index date, male or female, registered with TPP at index date, with 3 months complete registration, a valid address and postcode
     # EXCLUDE: 15+ people in the household, missing age, missing sex, missing region, missing IMD, any person in household is care home, joined TPP after 01/02/2020
+    # sex, household size and registration on 01/02/2020 do not depend on the index date - they are in study_definition_static.py and applied by analysis/join_static.py
 
     population=patients.satisfying(
         # first argument is a string defining the population of interest using elementary logic syntax (= != < <= >= > AND OR NOT + - * /)
@@ -45,14 +46,10 @@ study = StudyDefinition(
         (age >= 18 AND age < 120) AND 
         is_registered_with_tpp AND 
         (NOT died) AND
-        (sex = "M" OR sex = "F") AND 
         (care_home_type = "PR") AND
         has_follow_up AND
-        is_registered_with_tpp_feb2020 AND
         (region != "") AND
-        (imd != "0") AND
-        household_size <= 15 AND
-        household_size > 0
+        (imd != "0")
         """,
           
     ),
@@ -60,15 +57,7 @@ study = StudyDefinition(
    
     # define the study variables
 
-    # DEMOGRAPHICS - sex, age, ethnicity
-
-        ## sex 
-        sex=patients.sex(
-            return_expectations={
-                "rate": "universal",
-                "category": {"ratios": {"M": 0.49, "F": 0.51}},
-            } 
-        ),
+    # DEMOGRAPHICS - age
 
         ## age 
         age=patients.age_as_of(
@@ -95,17 +84,8 @@ study = StudyDefinition(
         ),
         
 
-        ## ethnicity in 6 categories
-        ethnicity6=patients.with_these_clinical_events(
-            ethnicity_codes_6,
-            returning="category",
-            find_last_match_in_period=True,
-            return_expectations={
-                "category": {"ratios": {"1": 0.8, "5": 0.1, "3": 0.1}},
-                "incidence": 0.75,
-            },
-        ),
-        
+        ## sex and ethnicity do not depend on the index date - see study_definition_static.py
+
     # REGISTRATION DETAILS
         # died
         died=patients.died_from_any_cause(
@@ -117,11 +97,6 @@ study = StudyDefinition(
             "index_date",
         ),
 
-        ## registered with TPP on date of household identification (1st Feb 2020)
-        is_registered_with_tpp_feb2020=patients.registered_as_of(
-            "2020-02-01",
-        ),
-
         ## registered with one practice for 90 days prior to index date        
         has_follow_up=patients.registered_with_one_practice_between(
             "index_date - 90 days", "index_date",
@@ -156,98 +131,8 @@ study = StudyDefinition(
             },
         ),
 
-        ## household ID
-        household_id=patients.household_as_of(
-            "2020-02-01",
-            returning="pseudo_id",
-            return_expectations={
-                "int": {"distribution": "normal", "mean": 1000, "stddev": 200},
-                "incidence": 1,
-            },
-        ),
-
-         ## household size
-        household_size=patients.household_as_of(
-            "2020-02-01", 
-            returning="household_size", 
-            return_expectations={
-                "int": {"distribution": "normal", "mean": 3, "stddev": 1},
-                "incidence": 1,
-            },
-        ),
-
-        ## SENSITIVITY ANALYSIS - EXCLUDE HOUSEHOLDS OF MORE THAN 10
-        big=patients.categorised_as(
-            {
-                "missing": "DEFAULT",
-                "normal household": "household_size <= 10",
-                "big household": "household_size > 10",
-
-            },
-            return_expectations={
-                "rate":"universal",
-                "category": {
-                    "ratios": {
-                        "normal household": 0.99, 
-                        "big household": 0.01, 
-                        },
-                        },
-            },
-        ),
-        
-       ## living alone status
-        living_alone=patients.categorised_as(
-            {
-                "missing": "DEFAULT",
-                "living alone": "household_size = 1",
-                "not living alone": "household_size > 1",
-            },
-            return_expectations={
-                "rate":"universal",
-                "category": {
-                    "ratios": {
-                        "living alone": 0.2, 
-                        "not living alone": 0.8, 
-                        },
-                        },
-            },
-        ),       
-
-        ## non-TPP patients in household
-        mixed_household=patients.household_as_of(
-        "2020-02-01",
-        returning="has_members_in_other_ehr_systems",
-        return_expectations={ "incidence": 0.75
-        },
-        ),
-
-        ## percent of patients in TPP in the household
-        percent_tpp=patients.household_as_of(
-        "2020-02-01",
-        returning="percentage_of_members_with_data_in_this_backend",
-        return_expectations={"int": {"distribution": "normal", "mean": 75, "stddev": 10},
-        },
-        ),
-
-## SENSITIVITY ANALYSIS - EXCLUDE HOUSEHOLDS WHERE TPP % IS LESS THAN 100%
-        all_tpp=patients.categorised_as(
-            {
-                "missing": "DEFAULT",
-                "not all TPP": "percent_tpp < 100",
-                "all TPP": "percent_tpp = 100",
- 
-            },
-            return_expectations={
-                "rate":"universal",
-                "category": {
-                    "ratios": {
-                        "not all TPP": 0.90,
-                        "all TPP": 0.10,
-                        },
-                        },
-            },
-        ),
-
+        ## household ID, size, living alone status, mixed households and percent TPP are fixed at 01/02/2020
+        # extracted once by study_definition_static.py and joined onto each month by analysis/join_static.py
 
     # ADMINISTRATIVE INFORMATION
 
@@ -302,44 +187,7 @@ study = StudyDefinition(
             },
         ),
 
-        ## URBAN/RURAL LOCATION
-        urban=patients.address_as_of(
-            "2020-02-01",
-            returning="rural_urban_classification",
-            return_expectations={
-                "rate": "universal",
-                "category": {"ratios": {1: 0.125, 2: 0.125, 3: 0.125, 4: 0.125, 5: 0.125, 6: 0.125, 7: 0.125, 8: 0.125}},
-            }
-        ),
-
-    ### PRIMIS overall flag for shielded group
-    shielded=patients.satisfying(
-            """ severely_clinically_vulnerable
-            AND NOT less_vulnerable""", 
-        return_expectations={
-            "incidence": 0.01,
-                },
-
-            ### SHIELDED GROUP - first flag all patients with "high risk" codes
-        severely_clinically_vulnerable=patients.with_these_clinical_events(
-            high_risk_codes, # note no date limits set
-            find_last_match_in_period = True,
-            return_expectations={"incidence": 0.02,},
-        ),
-
-        # find date at which the high risk code was added
-        date_severely_clinically_vulnerable=patients.date_of(
-            "severely_clinically_vulnerable", 
-            date_format="YYYY-MM-DD",   
-        ),
-
-        ### NOT SHIELDED GROUP (medium and low risk) - only flag if later than 'shielded'
-        less_vulnerable=patients.with_these_clinical_events(
-            not_high_risk_codes, 
-            on_or_after="date_severely_clinically_vulnerable",
-            return_expectations={"incidence": 0.01,},
-        ),
-    ),
+        ## urban/rural location (as of 01/02/2020) and shielding status do not depend on the index date - see study_definition_static.py
 
 
 
@@ -0,0 +1,151 @@
+# STUDY DEFINITION FOR ATTRIBUTES THAT DO NOT DEPEND ON THE INDEX DATE
+
+# These are extracted once and joined onto every monthly cohort by analysis/join_static.py,
+# which also derives living_alone, big and all_tpp from them.
+# Run `python analysis/hoisting.py` to check which variables can be moved here
+
+# Import necessary functions
+
+from cohortextractor import (
+    StudyDefinition,
+    patients,
+)
+
+# Import all codelists
+
+from codelists import *
+
+
+
+
+# Specify study definition
+
+study = StudyDefinition(
+    default_expectations={
+        "date": {"earliest": "1900-01-01", "latest": "today"},
+        "rate": "uniform",
+        "incidence": 0.5,
+    },
+
+    # define the study index date - date of household identification
+    index_date="2020-02-01",
+
+    # INCLUDE: registered with TPP on 01/02/2020, male or female
+    # EXCLUDE: 15+ people in the household, missing sex
+    # only patients in this population are kept in the monthly cohorts
+
+    population=patients.satisfying(
+        """
+        is_registered_with_tpp_feb2020 AND
+        (sex = "M" OR sex = "F") AND
+        household_size <= 15 AND
+        household_size > 0
+        """,
+    ),
+
+    # DEMOGRAPHICS - sex, ethnicity
+
+        ## sex 
+        sex=patients.sex(
+            return_expectations={
+                "rate": "universal",
+                "category": {"ratios": {"M": 0.49, "F": 0.51}},
+            } 
+        ),
+
+        ## ethnicity in 6 categories - last match over all history, so the same for every index date
+        ethnicity6=patients.with_these_clinical_events(
+            ethnicity_codes_6,
+            returning="category",
+            find_last_match_in_period=True,
+            return_expectations={
+                "category": {"ratios": {"1": 0.8, "5": 0.1, "3": 0.1}},
+                "incidence": 0.75,
+            },
+        ),
+
+    # REGISTRATION DETAILS
+
+        ## registered with TPP on date of household identification (1st Feb 2020)
+        is_registered_with_tpp_feb2020=patients.registered_as_of(
+            "2020-02-01",
+        ),
+
+    # HOUSEHOLD INFORMATION
+
+        ## household ID
+        household_id=patients.household_as_of(
+            "2020-02-01",
+            returning="pseudo_id",
+            return_expectations={
+                "int": {"distribution": "normal", "mean": 1000, "stddev": 200},
+                "incidence": 1,
+            },
+        ),
+
+         ## household size
+        household_size=patients.household_as_of(
+            "2020-02-01",
+            returning="household_size",
+            return_expectations={
+                "int": {"distribution": "normal", "mean": 3, "stddev": 1},
+                "incidence": 1,
+            },
+        ),
+
+        ## non-TPP patients in household
+        mixed_household=patients.household_as_of(
+        "2020-02-01",
+        returning="has_members_in_other_ehr_systems",
+        return_expectations={ "incidence": 0.75
+        },
+        ),
+
+        ## percent of patients in TPP in the household
+        percent_tpp=patients.household_as_of(
+        "2020-02-01",
+        returning="percentage_of_members_with_data_in_this_backend",
+        return_expectations={"int": {"distribution": "normal", "mean": 75, "stddev": 10},
+        },
+        ),
+
+        ## URBAN/RURAL LOCATION
+        urban=patients.address_as_of(
+            "2020-02-01",
+            returning="rural_urban_classification",
+            return_expectations={
+                "rate": "universal",
+                "category": {"ratios": {1: 0.125, 2: 0.125, 3: 0.125, 4: 0.125, 5: 0.125, 6: 0.125, 7: 0.125, 8: 0.125}},
+            }
+        ),
+
+    ### PRIMIS overall flag for shielded group
+    shielded=patients.satisfying(
+            """ severely_clinically_vulnerable
+            AND NOT less_vulnerable""", 
+        return_expectations={
+            "incidence": 0.01,
+                },
+
+            ### SHIELDED GROUP - first flag all patients with "high risk" codes
+        severely_clinically_vulnerable=patients.with_these_clinical_events(
+            high_risk_codes, # note no date limits set
+            find_last_match_in_period = True,
+            return_expectations={"incidence": 0.02,},
+        ),
+
+        # find date at which the high risk code was added
+        date_severely_clinically_vulnerable=patients.date_of(
+            "severely_clinically_vulnerable", 
+            date_format="YYYY-MM-DD",   
+        ),
+
+        ### NOT SHIELDED GROUP (medium and low risk) - only flag if later than 'shielded'
+        less_vulnerable=patients.with_these_clinical_events(
+            not_high_risk_codes, 
+            on_or_after="date_severely_clinically_vulnerable",
+            return_expectations={"incidence": 0.01,},
+        ),
+    ),
+
+)
@@ -0,0 +1,184 @@
+"""Read study definitions without importing cohortextractor.
+
+The study definitions are parsed with `ast`, so the variables, their arguments and
+`return_expectations`, and the `measures` list can be inspected by the Python actions
+that run in the `python` image, and locally without cohortextractor installed.
+"""
+
+import ast
+import datetime
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+class Expression(str):
+    """Source text of an argument that is not a literal, e.g. a codelist name."""
+
+
+@dataclass
+class Variable:
+    name: str
+    function: str
+    args: list
+    kwargs: dict
+    parent: str = None
+    children: list = field(default_factory=list)
+
+    @property
+    def return_expectations(self):
+        return self.kwargs.get("return_expectations") or {}
+
+    @property
+    def returning(self):
+        return self.kwargs.get("returning")
+
+    def identifiers(self):
+        """Names used in the arguments (not the expectations), e.g. variables and dates."""
+        arguments = [self.args] + [
+            value for key, value in self.kwargs.items() if key != "return_expectations"
+        ]
+        return {name for text in strings(arguments) for name in IDENTIFIER.findall(text)}
+
+
+@dataclass
+class Study:
+    path: Path
+    index_date: str
+    default_expectations: dict
+    population: Variable
+    variables: dict
+
+
+def strings(value):
+    """Yield the strings in a parsed argument, recursing into lists and dict values."""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from strings(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from strings(item)
+
+
+def resolve_date(value, index_date):
+    """Return the date a date argument stands for: "today", "index_date" or a date."""
+    if value == "today":
+        return datetime.date.today().isoformat()
+    if value == "index_date":
+        return index_date
+    return value
+
+
+def _is_patients_call(node):
+    return (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and isinstance(node.func.value, ast.Name)
+        and node.func.value.id == "patients"
+    )
+
+
+def _value(node):
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        return Expression(ast.unparse(node))
+
+
+def _variable(name, call, variables, parent=None):
+    """Build a Variable from a `patients.<function>(...)` call.
+
+    Variables defined inside another variable's arguments (e.g. the components of a
+    `patients.satisfying` expression) are added to `variables` before their parent,
+    which is the order cohortextractor evaluates them in.
+    """
+    kwargs = {}
+    children = []
+    for keyword in call.keywords:
+        if _is_patients_call(keyword.value):
+            _variable(keyword.arg, keyword.value, variables, parent=name)
+            children.append(keyword.arg)
+        elif keyword.arg == "return_expectations":
+            kwargs[keyword.arg] = ast.literal_eval(keyword.value)
+        else:
+            kwargs[keyword.arg] = _value(keyword.value)
+    variable = Variable(
+        name=name,
+        function=call.func.attr,
+        args=[_value(arg) for arg in call.args],
+        kwargs=kwargs,
+        parent=parent,
+        children=children,
+    )
+    variables[name] = variable
+    return variable
+
+
+def _module(path):
+    return ast.parse(Path(path).read_text(), filename=str(path))
+
+
+def _assignment(module, name):
+    for node in module.body:
+        if isinstance(node, ast.Assign) and any(
+            isinstance(target, ast.Name) and target.id == name for target in node.targets
+        ):
+            return node.value
+    raise ValueError(f"No assignment to {name}")
+
+
+def load_study(path):
+    """Parse the `study = StudyDefinition(...)` call in a study definition."""
+    call = _assignment(_module(path), "study")
+    variables = {}
+    population = None
+    index_date = None
+    default_expectations = {}
+    for keyword in call.keywords:
+        if keyword.arg == "population":
+            population = _variable("population", keyword.value, variables)
+            del variables["population"]
+        elif keyword.arg == "index_date":
+            index_date = ast.literal_eval(keyword.value)
+        elif keyword.arg == "default_expectations":
+            default_expectations = ast.literal_eval(keyword.value)
+        elif _is_patients_call(keyword.value):
+            _variable(keyword.arg, keyword.value, variables)
+    return Study(
+        path=Path(path),
+        index_date=index_date,
+        default_expectations=default_expectations,
+        population=population,
+        variables=variables,
+    )
+
+
+@dataclass
+class MeasureDefinition:
+    id: str
+    numerator: str
+    denominator: str
+    group_by: list
+
+
+def load_measures(path):
+    """Parse the `measures = [Measure(...), ...]` list in a study definition."""
+    measures = []
+    for call in _assignment(_module(path), "measures").elts:
+        kwargs = {keyword.arg: ast.literal_eval(keyword.value) for keyword in call.keywords}
+        group_by = kwargs.get("group_by") or []
+        if isinstance(group_by, str):
+            group_by = [group_by]
+        measures.append(
+            MeasureDefinition(
+                id=kwargs["id"],
+                numerator=kwargs["numerator"],
+                denominator=kwargs["denominator"],
+                group_by=list(group_by),
+            )
+        )
+    return measures
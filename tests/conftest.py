@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the analysis scripts import each other as top-level modules, as they do when run
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "analysis"))
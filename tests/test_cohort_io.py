@@ -0,0 +1,39 @@
+from cohort_io import CATEGORY, DATE, FLAG, FLOAT, INT, variable_type
+from study_parser import Variable
+
+
+def variable(function, **kwargs):
+    return Variable("x", function, [], kwargs)
+
+
+def test_returning_decides_over_expectations():
+    date_range = {"date": {"earliest": "2018-01-01", "latest": "today"}, "incidence": 0.1}
+    flag = variable(
+        "with_these_clinical_events", returning="binary_flag", return_expectations=date_range
+    )
+    assert variable_type(flag) == FLAG
+    first_date = variable(
+        "with_these_clinical_events",
+        returning="first_date_in_period",
+        return_expectations=date_range,
+    )
+    assert variable_type(first_date) == DATE
+    count = variable(
+        "with_these_clinical_events",
+        returning="number_of_matches_in_period",
+        return_expectations={"int": {"distribution": "poisson", "mean": 2}},
+    )
+    assert variable_type(count) == INT
+    value = variable(
+        "with_these_clinical_events",
+        returning="numeric_value",
+        return_expectations={"float": {"distribution": "normal", "mean": 25, "stddev": 5}},
+    )
+    assert variable_type(value) == FLOAT
+
+
+def test_expectations_are_the_fallback():
+    assert variable_type(variable("sex", return_expectations={"rate": "universal"})) == CATEGORY
+    assert variable_type(variable("registered_as_of")) == FLAG
+    derived = variable("satisfying", return_expectations={"float": {"mean": 1}})
+    assert variable_type(derived) == FLOAT
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from disclosure import rounding_scheme, suppress
+
+
+def measures(rows, group_columns):
+    frame = pd.DataFrame(rows, columns=["measure_id", *group_columns, "numerator"])
+    frame.insert(1, "date", "2020-01-01")
+    frame["denominator"] = 1000
+    frame["value"] = frame["numerator"] / frame["denominator"]
+    return frame
+
+
+def test_lone_suppressed_cell_gets_a_complementary_cell():
+    # the living-alone cells add up to the living-alone total in another measure, so
+    # suppressing (living alone, A) alone would let it be worked out
+    frame = measures(
+        [
+            ["x_region", "living alone", "A", 3],
+            ["x_region", "living alone", "B", 20],
+            ["x_region", "living alone", "C", 10],
+        ],
+        ["living_alone", "region"],
+    )
+    suppressed, primary = suppress(frame, 8)
+    assert primary == 1
+    # the smallest other cell is suppressed with it
+    assert suppressed.tolist() == [True, False, True]
+
+
+def test_complementary_suppression_across_both_group_columns():
+    frame = measures(
+        [
+            ["x_sex", "living alone", "F", 3],
+            ["x_sex", "living alone", "M", 50],
+            ["x_sex", "not living alone", "F", 40],
+            ["x_sex", "not living alone", "M", 60],
+            ["x_rate", "living alone", None, 53],
+            ["x_rate", "not living alone", None, 100],
+        ],
+        ["living_alone", "sex"],
+    )
+    suppressed, primary = suppress(frame, 8)
+    assert primary == 1
+    # no set of cells adding up across sex or across living_alone has one cell
+    # suppressed, so every cell of the 2 x 2 table goes; x_rate is left alone
+    assert suppressed.tolist() == [True, True, True, True, False, False]
+
+
+def test_zero_counts_are_not_suppressed():
+    frame = measures(
+        [["x_rate", "living alone", 0], ["x_rate", "not living alone", 12]],
+        ["living_alone"],
+    )
+    suppressed, primary = suppress(frame, 8)
+    assert primary == 0
+    assert not suppressed.any()
+
+
+def test_midpoint7_matches_self_harm_graph():
+    counts = np.arange(30)
+    expected = np.where(counts == 0, 0, np.ceil(counts / 7) * 7 - 3)
+    assert (rounding_scheme("midpoint7")(counts) == expected).all()
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from its import design, newey_west
+
+
+def series(seed, group_by, levels):
+    """Return a measure over 47 months with a few rows missing, as in measure_<id>.csv."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2018-03-01", periods=47, freq="MS").strftime("%Y-%m-%d")
+    frame = pd.MultiIndex.from_product(
+        [*levels, dates], names=[*group_by, "date"]
+    ).to_frame(index=False)
+    frame["population"] = rng.integers(1000, 5000, len(frame))
+    frame["events"] = rng.binomial(frame["population"], 0.01)
+    frame["value"] = frame["events"] / frame["population"]
+    return frame.drop(index=rng.choice(len(frame), 3, replace=False))
+
+
+def reference(X, y, lags):
+    """Fit one series with explicit loops over its observed (group, month) rows."""
+    rows = [(g, t) for g in range(X.shape[0]) for t in range(X.shape[1]) if X[g, t].any()]
+    Xr = np.array([X[g, t] for g, t in rows])
+    yr = np.array([y[g, t] for g, t in rows])
+    beta = np.linalg.lstsq(Xr, yr, rcond=None)[0]
+    e = yr - Xr @ beta
+    meat = sum(e[i] ** 2 * np.outer(Xr[i], Xr[i]) for i in range(len(rows)))
+    for lag in range(1, lags + 1):
+        for i, (g, t) in enumerate(rows):
+            for j, (g2, t2) in enumerate(rows):
+                if g2 == g and t2 == t - lag:
+                    cross = e[i] * e[j] * np.outer(Xr[i], Xr[j])
+                    meat += (1 - lag / (lags + 1)) * (cross + cross.T)
+    n = len(rows)
+    bread = np.linalg.pinv(Xr.T @ Xr)
+    covariance = n / (n - np.linalg.matrix_rank(Xr)) * bread @ meat @ bread
+    return beta, np.sqrt(np.diag(covariance))
+
+
+def test_batched_fit_matches_one_series_at_a_time():
+    group_by = ["living_alone", "region"]
+    levels = [["living alone", "not living alone"], ["East", "London", "North West"]]
+    designs = [design(series(seed, group_by, levels), group_by) for seed in range(3)]
+    X = np.stack([X for _, X, _ in designs])
+    y = np.stack([y for _, _, y in designs])
+    for lags in [1, 2]:
+        beta, std_error, _, _ = newey_west(X, y, lags)
+        for i, (_, X_i, y_i) in enumerate(designs):
+            expected_beta, expected_std_error = reference(X_i, y_i, lags)
+            np.testing.assert_allclose(beta[i], expected_beta, rtol=1e-10, atol=1e-10)
+            np.testing.assert_allclose(std_error[i], expected_std_error, rtol=1e-10, atol=1e-10)
@@ -0,0 +1,27 @@
+from collections import Counter
+
+from report import Summary, summary_tables
+
+
+def summary(categories):
+    summary = Summary()
+    summary.categories["region"] = Counter(categories)
+    return summary
+
+
+def test_small_counts_are_suppressed_with_a_complement_and_the_rest_rounded():
+    summaries = {
+        "2020-01-01": summary({"East": 3, "London": 40, "North": 22}),
+        "2020-02-01": summary({"East": 12, "London": 41, "North": 23}),
+    }
+    _, categories = summary_tables(summaries, threshold=8)
+    counts = categories.set_index(["date", "category"])["count"]
+    # East is below the threshold in January, and North is its complement in that month
+    assert counts.isna()[("2020-01-01", "East")]
+    assert counts.isna()[("2020-01-01", "North")]
+    # January's East is the only East cell suppressed, so February's is too, and then
+    # February's North as its complement
+    assert counts.isna()[("2020-02-01", "East")]
+    assert counts.isna()[("2020-02-01", "North")]
+    assert counts[("2020-01-01", "London")] == 40
+    assert counts[("2020-02-01", "London")] == 40